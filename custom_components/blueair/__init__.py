@@ -1,63 +1,359 @@
 """The blueair integration."""
 
 import asyncio
+from contextlib import suppress
+from datetime import timedelta
+from functools import partial
 import logging
+import os
+import time
+from typing import Any
+
+import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_PASSWORD, CONF_USERNAME, Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
+    Platform,
+)
+from homeassistant.core import Event, HomeAssistant, callback
 from homeassistant.exceptions import Unauthorized
+from homeassistant.helpers import config_validation as cv, device_registry as dr
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import (
+    async_track_time_interval,
+    async_track_utc_time_change,
+)
+from homeassistant.helpers.typing import ConfigType
 
 from . import blueair
-from .const import CLIENT, DOMAIN
+from .analytics import BlueairAnalytics
+from .archive import remove_archives
+from .const import (
+    ANALYTICS,
+    CLIENT,
+    CONF_AUTH_TOKEN,
+    CONF_DEVICES,
+    CONF_HOME_HOST,
+    CONF_VALIDATED_AT,
+    DOMAIN,
+    FLEET,
+    MIDDLEWARE,
+    SIGNAL_ADD_DEVICES,
+    SNAPSHOTS,
+    TRACER,
+    WORKER,
+)
 from .device import BlueairDataUpdateCoordinator
+from .fleet import async_get_fleet
+from .services import async_setup_services, async_unload_services
+from .snapshot import SnapshotStore
+from .tracing import CONF_FILE, CONF_OTLP_ENDPOINT, build_tracer_provider, span
+from .websocket_api import async_register_websocket_commands
+from .worker import BlueairWorker
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS = [Platform.BINARY_SENSOR, Platform.FAN, Platform.SENSOR]
 
+CONF_RECORD = "record"
+CONF_REPLAY = "replay"
+CONF_TRACE = "trace"
+CONF_WORKER = "worker"
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.Schema(
+            {
+                vol.Exclusive(CONF_RECORD, "fixtures"): cv.string,
+                vol.Exclusive(CONF_REPLAY, "fixtures"): cv.isfile,
+                vol.Optional(CONF_WORKER, default=False): cv.boolean,
+                vol.Optional(CONF_TRACE): vol.All(
+                    vol.Schema(
+                        {
+                            vol.Exclusive(CONF_OTLP_ENDPOINT, "exporter"): cv.url,
+                            vol.Exclusive(CONF_FILE, "exporter"): cv.string,
+                        }
+                    ),
+                    cv.has_at_least_one_key(CONF_OTLP_ENDPOINT, CONF_FILE),
+                ),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+# Devices are rarely added or removed, so the device list is checked seldom
+DISCOVERY_INTERVAL = timedelta(hours=1)
+# The token and device list the config flow validated are used by a setup
+# this soon after. Later setups log in again but keep the home host.
+SESSION_MAX_AGE = 600
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the HTTP middleware and tracing shared by all config entries.
+
+    Traffic can be recorded to a fixture file, or replayed from one instead
+    of reaching the BlueAir cloud, to profile the integration offline, and
+    traced to find where the time of a slow refresh went.
+    """
+    conf = config.get(DOMAIN, {})
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    domain_data[CONF_WORKER] = conf.get(CONF_WORKER, False)
+    if CONF_TRACE in conf:
+        provider = await hass.async_add_executor_job(
+            build_tracer_provider, conf[CONF_TRACE]
+        )
+        if provider is not None:
+            domain_data[TRACER] = provider.get_tracer(__name__)
+
+            async def _async_flush_traces(_: Event) -> None:
+                await hass.async_add_executor_job(provider.shutdown)
+
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_flush_traces)
+
+    domain_data[MIDDLEWARE] = await hass.async_add_executor_job(
+        _build_middleware, conf, domain_data.get(TRACER)
+    )
+    async_register_websocket_commands(hass)
+    return True
+
+
+def _build_middleware(conf: dict[str, Any], tracer: Any) -> list:
+    """Return the middleware for the configured recording and tracing."""
+    middleware = [blueair.MetricsMiddleware()]
+    if tracer is not None:
+        middleware.insert(0, blueair.TracingMiddleware(tracer))
+    if CONF_RECORD in conf:
+        middleware.append(blueair.RecordMiddleware(conf[CONF_RECORD]))
+    if CONF_REPLAY in conf:
+        middleware.append(blueair.ReplayMiddleware(conf[CONF_REPLAY]))
+    return middleware
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up blueair from a config entry."""
+    with span(hass, "blueair.setup_entry", {"blueair.entry_id": entry.entry_id}):
+        return await _async_setup_entry(hass, entry)
+
+
+async def _async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Log in, create the devices and forward the platforms."""
     async_get_clientsession(hass)
-    hass.data.setdefault(DOMAIN, {})
+    fleet = async_get_fleet(hass)
     hass.data[DOMAIN][entry.entry_id] = {}
 
+    fresh = time.time() - entry.data.get(CONF_VALIDATED_AT, 0) < SESSION_MAX_AGE
+    home_host = entry.data.get(CONF_HOME_HOST)
+    # Connections for the first poll are opened in the background while the
+    # entry logs in and loads its devices, setup doesn't wait for them
+    if home_host:
+        _async_warm_up(hass, entry, home_host)
     try:
-        client = await hass.async_add_executor_job(
-            lambda: blueair.BlueAir(
-                username=entry.data[CONF_USERNAME], password=entry.data[CONF_PASSWORD]
-            )
+        client = await fleet.async_add_job(
+            entry.entry_id,
+            partial(
+                blueair.BlueAir,
+                username=entry.data[CONF_USERNAME],
+                password=entry.data[CONF_PASSWORD],
+                home_host=home_host,
+                auth_token=entry.data.get(CONF_AUTH_TOKEN) if fresh else None,
+                transport=fleet.transport,
+            ),
         )
         hass.data[DOMAIN][entry.entry_id][CLIENT] = client
     except KeyError as e:
         raise Unauthorized("BlueAir authorization failed") from e
+    if not home_host:
+        _async_warm_up(hass, entry, client.home_host)
 
-    devices = await hass.async_add_executor_job(lambda: client.get_devices())
+    if fresh and CONF_DEVICES in entry.data:
+        devices = entry.data[CONF_DEVICES]
+    else:
+        devices = await fleet.async_add_job(entry.entry_id, client.get_devices)
+    # The config flow's session is only valid for a short while, so the token
+    # and the device list aren't kept around once used, the home host is
+    data = {
+        key: value
+        for key, value in entry.data.items()
+        if key not in (CONF_AUTH_TOKEN, CONF_DEVICES, CONF_VALIDATED_AT)
+    }
+    if data != entry.data:
+        hass.config_entries.async_update_entry(entry, data=data)
     hass.data[DOMAIN][entry.entry_id]["devices"] = [
-        BlueairDataUpdateCoordinator(hass, client, device["uuid"], device["name"])
-        for device in devices
+        _async_create_device(hass, entry, device) for device in devices
     ]
     _LOGGER.debug("BlueAir Devices %s", devices)
 
-    tasks = [
-        device.async_refresh()
-        for device in hass.data[DOMAIN][entry.entry_id]["devices"]
-    ]
-    await asyncio.gather(*tasks)
+    snapshots = SnapshotStore(
+        hass, entry.entry_id, hass.data[DOMAIN][entry.entry_id]["devices"]
+    )
+    await snapshots.async_load()
+    hass.data[DOMAIN][entry.entry_id][SNAPSHOTS] = snapshots
+
+    # Devices with a snapshot serve it right away and revalidate at their
+    # poll phase, only devices never seen before hold up the setup
+    await asyncio.gather(
+        *[
+            device.async_refresh()
+            for device in hass.data[DOMAIN][entry.entry_id]["devices"]
+            if not snapshots.async_restore(device)
+        ]
+    )
 
     try:
         await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     except AttributeError:
         hass.config_entries.async_setup_platforms(entry, PLATFORMS)
 
+    use_worker = hass.data[DOMAIN].get(CONF_WORKER, False)
+    fleet.async_add_account(
+        entry.entry_id, hass.data[DOMAIN][entry.entry_id]["devices"], not use_worker
+    )
+    if use_worker:
+        worker = BlueairWorker(
+            hass,
+            entry.data[CONF_USERNAME],
+            entry.data[CONF_PASSWORD],
+            client,
+            hass.data[DOMAIN][entry.entry_id]["devices"],
+        )
+        await worker.async_start()
+        hass.data[DOMAIN][entry.entry_id][WORKER] = worker
+    async_setup_services(hass)
+
+    async def _async_discover(*_) -> None:
+        await _async_discover_devices(hass, entry)
+
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_discover, DISCOVERY_INTERVAL)
+    )
+
+    analytics = BlueairAnalytics(hass, hass.data[DOMAIN][entry.entry_id]["devices"])
+    hass.data[DOMAIN][entry.entry_id][ANALYTICS] = analytics
+    hass.async_create_task(analytics.async_refresh())
+    # Hourly, so a day skipped while shedding load is caught up. Computing
+    # happens once the last sample of the day has been finalized, the other
+    # calls return the cached day or retry the devices that failed.
+    entry.async_on_unload(
+        async_track_utc_time_change(
+            hass, analytics.async_refresh, minute=10, second=0
+        )
+    )
+
     return True
 
 
+@callback
+def _async_create_device(
+    hass: HomeAssistant, entry: ConfigEntry, device: dict[str, Any]
+) -> BlueairDataUpdateCoordinator:
+    """Create the coordinator for a device returned by get_devices."""
+    coordinator = BlueairDataUpdateCoordinator(
+        hass,
+        hass.data[DOMAIN][entry.entry_id][CLIENT],
+        device["uuid"],
+        device["name"],
+        hass.data[DOMAIN][FLEET],
+        entry.entry_id,
+    )
+
+    @callback
+    def _async_save_snapshots() -> None:
+        hass.data[DOMAIN][entry.entry_id][SNAPSHOTS].async_schedule_save()
+
+    coordinator.async_add_listener(_async_save_snapshots)
+    return coordinator
+
+
+@callback
+def _async_warm_up(hass: HomeAssistant, entry: ConfigEntry, home_host: str) -> None:
+    """Open connections to the home host without holding up the setup."""
+    entry.async_create_background_task(
+        hass,
+        hass.data[DOMAIN][FLEET].async_warm_up(entry.entry_id, f"https://{home_host}/"),
+        "BlueAir connection warm-up",
+    )
+
+
+async def _async_discover_devices(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Add and remove devices registered to the account since setup.
+
+    Only the difference is applied: existing coordinators and their entities
+    are left alone, so a fleet change costs one device list call.
+    """
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    fleet = hass.data[DOMAIN][FLEET]
+    if fleet.shedding:
+        return
+    try:
+        devices = await fleet.async_add_job(
+            entry.entry_id, entry_data[CLIENT].get_devices
+        )
+    except Exception as error:
+        _LOGGER.debug("BlueAir device discovery failed: %s", error)
+        return
+
+    # The fleet polls this very list, so it is changed in place
+    coordinators: list[BlueairDataUpdateCoordinator] = entry_data["devices"]
+    registered = {device["uuid"]: device for device in devices}
+    known = {coordinator.id for coordinator in coordinators}
+
+    removed = [device for device in coordinators if device.id not in registered]
+    if removed:
+        _LOGGER.debug("BlueAir devices removed: %s", [d.id for d in removed])
+        device_registry = dr.async_get(hass)
+        for coordinator in removed:
+            coordinators.remove(coordinator)
+            await coordinator.async_close_archive()
+            with suppress(OSError):
+                await hass.async_add_executor_job(os.remove, coordinator.archive.path)
+            device_entry = device_registry.async_get_device(
+                identifiers={(DOMAIN, coordinator.id)}
+            )
+            if device_entry is not None:
+                device_registry.async_update_device(
+                    device_entry.id, remove_config_entry_id=entry.entry_id
+                )
+
+    added = [
+        _async_create_device(hass, entry, device)
+        for uuid, device in registered.items()
+        if uuid not in known
+    ]
+    if added:
+        _LOGGER.debug("BlueAir devices added: %s", [d.id for d in added])
+        await asyncio.gather(*[device.async_refresh() for device in added])
+        coordinators.extend(added)
+        async_dispatcher_send(hass, f"{SIGNAL_ADD_DEVICES}_{entry.entry_id}", added)
+
+    if (removed or added) and WORKER in entry_data:
+        entry_data[WORKER].async_set_devices()
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+        if WORKER in entry_data:
+            await entry_data[WORKER].async_stop()
+        await entry_data[SNAPSHOTS].async_save()
+        await asyncio.gather(
+            *[device.async_close_archive() for device in entry_data["devices"]]
+        )
+        fleet = hass.data[DOMAIN][FLEET]
+        if fleet.async_remove_account(entry.entry_id):
+            hass.data[DOMAIN].pop(FLEET)
+            async_unload_services(hass)
+            await fleet.async_shutdown()
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the saved device snapshots and archives of a removed config entry."""
+    await SnapshotStore(hass, entry.entry_id, []).async_remove()
+    await hass.async_add_executor_job(remove_archives, hass, entry.entry_id)
@@ -0,0 +1,273 @@
+"""Daily air quality analytics across the devices of a config entry."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+import importlib
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .blueair.blueair import DEFAULT_SAMPLE_PERIOD
+from .const import DOMAIN, FLEET, LOGGER
+from .device import BlueairDataUpdateCoordinator
+
+# Analytics cover the previous full UTC day
+ANALYTICS_WINDOW = 86400
+# The archive tier holding the day at full resolution
+ARCHIVE_TIER = "5min"
+# WHO 24 hour PM2.5 guideline, samples at or below it count as clean air
+CLEAN_AIR_PM25 = 15.0
+# A falling PM2.5 level only counts as decay after a peak of at least this
+EVENT_PM25 = 35.0
+# Samples further apart than this are not treated as consecutive
+MAX_STEP = 2 * DEFAULT_SAMPLE_PERIOD
+
+
+def compute(
+    np: Any,
+    start: int,
+    series: dict[str, tuple[list[int], list[float]]],
+    rooms: dict[str, str],
+) -> dict[str, Any]:
+    """Compute the analytics of one day from the PM2.5 series of each device.
+
+    The series of all devices are laid out on one grid of sample periods so
+    every statistic is a vectorised operation over a device x time matrix.
+    The median of all devices stands in for the air the building lets in,
+    so how closely a device tracks it shows how much outside pollution
+    reaches its room.
+    """
+    uuids = list(series)
+    slots = ANALYTICS_WINDOW // DEFAULT_SAMPLE_PERIOD
+    grid = np.full((len(uuids), slots), np.nan)
+    for row, uuid in enumerate(uuids):
+        timestamps = np.asarray(series[uuid][0], dtype=np.int64)
+        values = np.asarray(series[uuid][1], dtype=np.float64)
+        index = (timestamps - start) // DEFAULT_SAMPLE_PERIOD
+        valid = (index >= 0) & (index < slots)
+        grid[row, index[valid]] = values[valid]
+
+    observed = ~np.isnan(grid)
+    counts = observed.sum(axis=1)
+    missing = np.full(len(uuids), np.nan)
+    filled = np.where(observed, grid, 0.0)
+    means = np.divide(
+        filled.sum(axis=1), counts, out=missing.copy(), where=counts > 0
+    )
+    clean = (observed & (filled <= CLEAN_AIR_PM25)).sum(axis=1)
+    effectiveness = np.divide(clean, counts, out=missing.copy(), where=counts > 0)
+    correlations = _correlations(np, grid, observed)
+
+    devices: dict[str, Any] = {}
+    for row, uuid in enumerate(uuids):
+        devices[uuid] = {
+            "samples": int(counts[row]),
+            "mean_pm25": _number(means[row]),
+            "effectiveness": _number(effectiveness[row] * 100),
+            "decay_rate": _decay_rate(np, *series[uuid]),
+            "correlation": _number(correlations[row]),
+        }
+
+    # Rooms with several purifiers are ranked by the mean of their devices
+    room_values: dict[str, list[float]] = {}
+    for uuid, analytics in devices.items():
+        if analytics["mean_pm25"] is not None:
+            room_values.setdefault(rooms[uuid], []).append(analytics["mean_pm25"])
+    room_means = {
+        room: round(sum(values) / len(values), 3)
+        for room, values in room_values.items()
+    }
+    ranking = sorted(room_means, key=room_means.__getitem__)
+    for uuid, analytics in devices.items():
+        analytics["room"] = rooms[uuid]
+        analytics["room_rank"] = (
+            ranking.index(rooms[uuid]) + 1 if rooms[uuid] in room_means else None
+        )
+
+    return {
+        "start": start,
+        "devices": devices,
+        "rooms": [
+            {"room": room, "rank": rank, "mean_pm25": room_means[room]}
+            for rank, room in enumerate(ranking, 1)
+        ],
+    }
+
+
+def _correlations(np: Any, grid: Any, observed: Any) -> Any:
+    """Return the Pearson correlation of every device with the fleet median."""
+    result = np.full(grid.shape[0], np.nan)
+    columns = observed.any(axis=0)
+    if grid.shape[0] < 2 or not columns.any():
+        return result
+    reference = np.full(grid.shape[1], np.nan)
+    reference[columns] = np.nanmedian(grid[:, columns], axis=0)
+    both = observed & columns
+    count = both.sum(axis=1)
+    x = np.where(both, grid, 0.0)
+    y = np.where(both, reference, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = np.where(both, x - (x.sum(axis=1) / count)[:, None], 0.0)
+        dy = np.where(both, y - (y.sum(axis=1) / count)[:, None], 0.0)
+        result = (dx * dy).sum(axis=1) / np.sqrt(
+            (dx**2).sum(axis=1) * (dy**2).sum(axis=1)
+        )
+    return np.where(count > 2, result, np.nan)
+
+
+def _decay_rate(np: Any, timestamps: list[int], values: list[float]) -> float | None:
+    """Return the median PM2.5 decay rate per hour after pollution events.
+
+    A step between consecutive samples is part of a decay when the level
+    falls and the run of falling steps it belongs to started at or above
+    EVENT_PM25. The rate of a step is the drop of the log level per hour,
+    the exponential decay constant of the room with the purifier running.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    t = np.asarray(timestamps, dtype=np.float64)
+    if y.size < 2:
+        return None
+    dt = np.diff(t)
+    falling = (np.diff(y) < 0) & (dt <= MAX_STEP) & (y[1:] > 0)
+    run_start = np.r_[True, ~falling]
+    starts = np.maximum.accumulate(np.where(run_start, np.arange(y.size), 0))[:-1]
+    decaying = falling & (y[starts] >= EVENT_PM25)
+    if not decaying.any():
+        return None
+    rates = -np.diff(np.log(np.maximum(y, 1e-3)))[decaying] / dt[decaying] * 3600
+    return _number(np.median(rates))
+
+
+def _series(rows: list[dict[str, Any]]) -> tuple[list[int], list[float]]:
+    """Return the timestamps and PM2.5 values of the datapoints having one."""
+    rows = [row for row in rows if row.get("pm25") is not None]
+    return [row["timestamp"] for row in rows], [row["pm25"] for row in rows]
+
+
+def _number(value: Any) -> float | None:
+    """Return a rounded float, or None for NaN."""
+    value = float(value)
+    if value != value:
+        return None
+    return round(value, 3)
+
+
+class BlueairAnalytics:
+    """Computes and caches the analytics of a config entry once per day.
+
+    Results are handed to the devices, whose sensors show them, and kept
+    for the service. Concurrent requests for the same day share one
+    computation. The day of every device is cached on its own, devices
+    whose day could not be fetched are retried by the next request, which
+    the hourly refresh makes at the latest.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, devices: list[BlueairDataUpdateCoordinator]
+    ) -> None:
+        """Initialize the analytics of the devices of a config entry."""
+        self.hass = hass
+        self._devices = devices
+        self._lock = asyncio.Lock()
+        self._start: int | None = None
+        self._series: dict[str, tuple[list[int], list[float]]] = {}
+        self._result: dict[str, Any] | None = None
+
+    async def async_refresh(self, *_) -> None:
+        """Compute the analytics of the previous day, logging failures.
+
+        Nothing is done while the fleet sheds load, a later call catches up.
+        """
+        if self.hass.data[DOMAIN][FLEET].shedding:
+            return
+        try:
+            await self.async_get()
+        except HomeAssistantError as error:
+            LOGGER.warning("BlueAir analytics are unavailable: %s", error)
+
+    async def async_get(self, now: datetime | None = None) -> dict[str, Any]:
+        """Return the analytics of the day before now, computing them once.
+
+        They are computed again when devices were missing from the last
+        computation, with the days fetched since.
+        """
+        now = now or dt_util.utcnow()
+        end = int(dt_util.as_timestamp(now)) // ANALYTICS_WINDOW * ANALYTICS_WINDOW
+        start = end - ANALYTICS_WINDOW
+        async with self._lock:
+            if self._start != start:
+                self._start = start
+                self._series = {}
+                self._result = None
+            missing = [
+                device
+                for device in self._devices
+                if device.has_sensors and device.id not in self._series
+            ]
+            if self._result is None or missing:
+                self._result = await self._async_compute(start, end, missing)
+                for device in self._devices:
+                    device.set_analytics(self._result["devices"].get(device.id))
+        return self._result
+
+    async def _async_compute(
+        self, start: int, end: int, missing: list[BlueairDataUpdateCoordinator]
+    ) -> dict[str, Any]:
+        """Fetch the day of the missing devices and compute the analytics."""
+        try:
+            np = await self.hass.async_add_executor_job(
+                importlib.import_module, "numpy"
+            )
+        except ImportError as error:
+            raise HomeAssistantError("BlueAir analytics require numpy") from error
+
+        # Devices whose archive holds the whole day cost no API call
+        fetched = []
+        for device in missing:
+            if device.archive.covers(ARCHIVE_TIER, start, end):
+                rows = device.archive.rows(ARCHIVE_TIER, start, end - 1)
+                self._series[device.id] = _series(
+                    [
+                        {"timestamp": row["timestamp"], "pm25": row["pm25_mean"]}
+                        for row in rows
+                        if "pm25_mean" in row
+                    ]
+                )
+            else:
+                fetched.append(device)
+        results = await asyncio.gather(
+            *[
+                device.fleet.async_add_job(
+                    device.account,
+                    device.api_client.get_data_points_between,
+                    device.id,
+                    start,
+                    end,
+                )
+                for device in fetched
+            ],
+            return_exceptions=True,
+        )
+        for device, rows in zip(fetched, results):
+            if isinstance(rows, Exception):
+                LOGGER.warning("BlueAir analytics skip %s: %s", device.id, rows)
+                continue
+            self._series[device.id] = _series(rows)
+
+        devices = [device for device in self._devices if device.has_sensors]
+        series = {
+            device.id: self._series[device.id]
+            for device in devices
+            if device.id in self._series
+        }
+        rooms = {
+            device.id: device.room_location or device.device_name
+            for device in devices
+        }
+        return await self.hass.async_add_executor_job(
+            compute, np, start, series, rooms
+        )
@@ -0,0 +1,230 @@
+"""Round-robin archive of Blueair datapoints in a memory-mapped file."""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Mapping
+import glob
+import mmap
+import os
+import struct
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .blueair.blueair import DEFAULT_SAMPLE_PERIOD
+from .const import DOMAIN
+
+# Measurements archived, in the order they are laid out in a slot
+METRICS = (
+    "pm1",
+    "pm10",
+    "pm25",
+    "voc",
+    "co2",
+    "temperature",
+    "humidity",
+    "all_pollution",
+)
+AGGREGATES = ("min", "mean", "max")
+# Name, seconds per slot and number of slots of every tier. Two days are
+# kept at full resolution so the previous UTC day is always complete.
+TIERS = (
+    ("5min", DEFAULT_SAMPLE_PERIOD, 576),
+    ("hour", 3600, 720),
+    ("day", 86400, 730),
+)
+
+MAGIC = b"BLUEAIR\x00"
+VERSION = 1
+# Magic, version, first and last archived timestamp, padded to HEADER_SIZE
+HEADER = struct.Struct("<8sIqq")
+HEADER_SIZE = 64
+# A slot holds its start, then the count, sum, minimum and maximum of every
+# metric, all as doubles
+SLOT_SIZE = 1 + 4 * len(METRICS)
+FILE_SIZE = HEADER_SIZE + sum(length for _, _, length in TIERS) * SLOT_SIZE * 8
+
+_EMPTY_SLOT = array("d", bytes(SLOT_SIZE * 8))
+
+
+def archive_path(hass: HomeAssistant, entry_id: str, device_uuid: str) -> str:
+    """Return the file archiving a device of a config entry."""
+    return hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.{device_uuid}.rrd")
+
+
+def remove_archives(hass: HomeAssistant, entry_id: str) -> None:
+    """Delete the archives of a config entry, blocking."""
+    for path in glob.glob(archive_path(hass, glob.escape(entry_id), "*")):
+        os.remove(path)
+
+
+class TimeSeriesArchive:
+    """Fixed-size archive of the datapoints of a device, like an RRD.
+
+    Every tier is a ring of slots aggregating the datapoints that fall into
+    them, a slot whose start doesn't match the datapoint being added is
+    recycled. The file never grows and only the pages being touched are
+    read into memory, so long ranges cost neither API calls nor memory.
+    Datapoints not newer than the last one archived are ignored, which
+    makes adding overlapping fetches safe.
+
+    The file is opened in an executor. Adding and reading only touch the
+    mapped memory and happen in the event loop, the kernel writes the
+    pages back, also after Home Assistant stopped.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the archive stored at path."""
+        self.path = path
+        self.first: int | None = None
+        self.last: int | None = None
+        self._mmap: mmap.mmap | None = None
+        self._data: memoryview | None = None
+        self._tiers: dict[str, tuple[int, int, int]] = {}
+        offset = 0
+        for name, step, length in TIERS:
+            self._tiers[name] = (offset, step, length)
+            offset += length * SLOT_SIZE
+
+    @property
+    def is_open(self) -> bool:
+        """Return if the file is mapped."""
+        return self._data is not None
+
+    def open(self) -> None:
+        """Map the file, creating it or starting over if it doesn't match."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            valid = (
+                os.fstat(fd).st_size == FILE_SIZE
+                and len(header) == HEADER.size
+                and HEADER.unpack(header)[:2] == (MAGIC, VERSION)
+            )
+            if not valid:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, FILE_SIZE)
+            # The mapping keeps a descriptor of its own
+            self._mmap = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+
+        if valid:
+            _, _, first, last = HEADER.unpack_from(self._mmap)
+            self.first = first or None
+            self.last = last or None
+        else:
+            self.first = self.last = None
+            self._write_header()
+        self._data = memoryview(self._mmap)[HEADER_SIZE:].cast("d")
+
+    def close(self) -> None:
+        """Unmap the file, its pages are written back by the kernel."""
+        if self._data is not None:
+            self._data.release()
+            self._data = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _write_header(self) -> None:
+        """Store the first and last archived timestamps."""
+        HEADER.pack_into(
+            self._mmap, 0, MAGIC, VERSION, self.first or 0, self.last or 0
+        )
+
+    def add(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """Add datapoints newer than the last archived one, return how many."""
+        if self._data is None:
+            return 0
+        added = 0
+        for row in rows:
+            timestamp = row["timestamp"]
+            if self.last is not None and timestamp <= self.last:
+                continue
+            values = [row.get(key) for key in METRICS]
+            for offset, step, length in self._tiers.values():
+                self._add_to_slot(offset, step, length, timestamp, values)
+            if self.first is None:
+                self.first = timestamp
+            self.last = timestamp
+            added += 1
+        if added:
+            self._write_header()
+        return added
+
+    def _add_to_slot(
+        self,
+        offset: int,
+        step: int,
+        length: int,
+        timestamp: int,
+        values: list[Any],
+    ) -> None:
+        """Aggregate the values of a datapoint into its slot of a tier."""
+        data = self._data
+        start = timestamp // step * step
+        base = offset + start // step % length * SLOT_SIZE
+        if data[base] != start:
+            data[base : base + SLOT_SIZE] = _EMPTY_SLOT
+            data[base] = start
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            value = float(value)
+            i = base + 1 + 4 * index
+            if data[i]:
+                data[i + 2] = min(data[i + 2], value)
+                data[i + 3] = max(data[i + 3], value)
+            else:
+                data[i + 2] = data[i + 3] = value
+            data[i] += 1
+            data[i + 1] += value
+
+    def covers(self, tier: str, start: int, end: int) -> bool:
+        """Return if a tier holds every datapoint between start and end."""
+        _, step, length = self._tiers[tier]
+        return (
+            self._data is not None
+            and self.first is not None
+            and self.first <= start
+            and self.last >= end - DEFAULT_SAMPLE_PERIOD
+            and (self.last // step - length + 1) * step <= start
+        )
+
+    def rows(self, tier: str, start: int, end: int) -> list[dict[str, Any]]:
+        """Return the slots of a tier starting between start and end.
+
+        Every row has the start of its slot as timestamp and the minimum,
+        mean and maximum of every metric as <metric>_min, <metric>_mean and
+        <metric>_max. Slots without datapoints are left out.
+        """
+        offset, step, length = self._tiers[tier]
+        data = self._data
+        if data is None or self.last is None:
+            return []
+        # Older slots have been recycled already or were never written, newer
+        # ones don't exist yet
+        first = max(
+            start // step * step,
+            (self.last // step - length + 1) * step,
+            self.first // step * step,
+        )
+        end = min(end, self.last)
+        rows = []
+        for slot in range(first, end + 1, step):
+            base = offset + slot // step % length * SLOT_SIZE
+            if data[base] != slot:
+                continue
+            row: dict[str, Any] = {"timestamp": slot}
+            for index, key in enumerate(METRICS):
+                i = base + 1 + 4 * index
+                count = data[i]
+                if count:
+                    row[f"{key}_min"] = data[i + 2]
+                    row[f"{key}_mean"] = round(data[i + 1] / count, 3)
+                    row[f"{key}_max"] = data[i + 3]
+            rows.append(row)
+        return rows
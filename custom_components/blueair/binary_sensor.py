@@ -7,9 +7,10 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntity,
     BinarySensorEntityDescription,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
-from .const import DOMAIN
+from .const import DOMAIN, SIGNAL_ADD_DEVICES
 from .device import BlueairDataUpdateCoordinator
 from .entity import BlueairEntity
 
@@ -19,27 +20,34 @@ async def async_setup_entry(
 ) -> None:
     """Set up the Blueair binary sensor entry."""
 
-    devices: list[BlueairDataUpdateCoordinator] = hass.data[DOMAIN][
-        config_entry.entry_id
-    ]["devices"]
-    entities = []
-    for device in devices:
-        # Don't add sensors to classic models
-        if (
-            device.model.startswith("classic") and not device.model.endswith("i")
-        ) or device.model == "foobot":
-            pass
-        else:
-            entities.extend(
-                [
-                    BlueairFilterStatusSensor(
-                        f"{device.device_name}_filter_status", device
-                    ),
-                    BlueairChildLockSensor(f"{device.device_name}_child_lock", device),
-                ]
-            )
-
-    async_add_entities(entities)
+    @callback
+    def async_add_devices(devices: list[BlueairDataUpdateCoordinator]) -> None:
+        entities = []
+        for device in devices:
+            # Don't add sensors to classic models
+            if (
+                device.model.startswith("classic") and not device.model.endswith("i")
+            ) or device.model == "foobot":
+                pass
+            else:
+                entities.extend(
+                    [
+                        BlueairFilterStatusSensor(
+                            f"{device.device_name}_filter_status", device
+                        ),
+                        BlueairChildLockSensor(
+                            f"{device.device_name}_child_lock", device
+                        ),
+                    ]
+                )
+        async_add_entities(entities)
+
+    async_add_devices(hass.data[DOMAIN][config_entry.entry_id]["devices"])
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, f"{SIGNAL_ADD_DEVICES}_{config_entry.entry_id}", async_add_devices
+        )
+    )
 
 
 class BlueairFilterStatusSensor(BlueairEntity, BinarySensorEntity):
@@ -2,6 +2,16 @@
 
 from .blueair import BlueAir
 from .blueair_aws import BlueAirAws
+from .resolver import DnsCache, DnsCachingAdapter
+from .transport import (
+    CacheMiddleware,
+    MetricsMiddleware,
+    RecordMiddleware,
+    ReplayMiddleware,
+    RetryMiddleware,
+    TracingMiddleware,
+    Transport,
+)
 
 __version__ = "1.0.0"
 
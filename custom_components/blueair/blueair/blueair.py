@@ -3,10 +3,25 @@
 import base64
 import logging
 import requests
-
-from typing import Any, Dict, List, Mapping, Union
+import time
+
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
 from typing_extensions import TypedDict
 
+from .json_stream import iter_data_point_rows
+from .transport import Transport
+
 logger = logging.getLogger(__name__)
 
 # The BlueAir API uses a fixed API key.
@@ -20,25 +35,50 @@ MeasurementBundle = TypedDict(
 MeasurementList = List[Mapping[str, Union[int, float]]]
 
 
+SENSOR_KEY_MAPPING = {
+    "time": "timestamp",
+    "pm": "pm25",
+    "pm1": "pm1",
+    "pm10": "pm10",
+    "tmp": "temperature",
+    "hum": "humidity",
+    "co2": "co2",
+    "voc": "voc",
+    "allpollu": "all_pollution",
+}
+
+# Size of the chunks read from a streamed response, in bytes.
+STREAM_CHUNK_SIZE = 65536
+
+
 def transform_data_points(data: MeasurementBundle) -> MeasurementList:
     """Transform a measurement list response from the Blueair API to a more pythonic data structure."""
-    key_mapping = {
-        "time": "timestamp",
-        "pm": "pm25",
-        "pm1": "pm1",
-        "pm10": "pm10",
-        "tmp": "temperature",
-        "hum": "humidity",
-        "co2": "co2",
-        "voc": "voc",
-        "allpollu": "all_pollution",
-    }
-
-    keys = [key_mapping[key] for key in data["sensors"]]
+    keys = [SENSOR_KEY_MAPPING[key] for key in data["sensors"]]
 
     return [dict(zip(keys, values)) for values in data["datapoints"]]
 
 
+# The server's default sample period, in seconds.
+DEFAULT_SAMPLE_PERIOD = 300
+
+
+def drop_partial_data_point(
+    results: MeasurementList, end_timestamp: int, sample_period: int = 0
+) -> MeasurementList:
+    """
+    Remove the last data point if its sample period has not ended yet.
+
+    The server returns the sample that is still being collected as the last
+    element. It only has its final values once end_timestamp is at least one
+    sample period past its timestamp.
+    """
+    period = sample_period or DEFAULT_SAMPLE_PERIOD
+    if results and results[-1]["timestamp"] + period > end_timestamp:
+        results.pop()
+
+    return results
+
+
 class BlueAir(object):
     """This class provides API calls to interact with the Blueair API."""
 
@@ -48,6 +88,8 @@ class BlueAir(object):
         password: str,
         home_host: str = None,
         auth_token: str = None,
+        session: requests.Session = None,
+        transport: Transport = None,
     ) -> None:
         """
         Instantiate a new Blueair client with the provided username and password.
@@ -56,7 +98,12 @@ class BlueAir(object):
         authentication token can be provided. This will cause the client to
         reuse a session from a previously initialized client and saves up to
         two API calls.
+
+        A shared requests session can be passed in so that several clients
+        reuse the same connection pool, or a transport to also share its
+        middleware.
         """
+        self.transport = transport or Transport(session)
         self.username = username
         self.password = password
         self.home_host = home_host
@@ -68,6 +115,30 @@ class BlueAir(object):
         if not self.auth_token:
             self.auth_token = self.get_auth_token()
 
+    @property
+    def home_host(self) -> Optional[str]:
+        """Return the server used to interact with the Blueair devices."""
+        return self._home_host
+
+    @home_host.setter
+    def home_host(self, home_host: Optional[str]) -> None:
+        self._home_host = home_host
+        # Built once here instead of for every request
+        self._api_url = f"https://{home_host}/v2/"
+
+    @property
+    def auth_token(self) -> Optional[str]:
+        """Return the authentication token of the session."""
+        return self._auth_token
+
+    @auth_token.setter
+    def auth_token(self, auth_token: Optional[str]) -> None:
+        self._auth_token = auth_token
+        # Built once per token instead of for every request
+        self._api_headers = MappingProxyType(
+            {"X-API-KEY-TOKEN": API_KEY, "X-AUTH-TOKEN": auth_token}
+        )
+
     def get_home_host(self) -> str:
         """
         Retrieve the home host for the current username.
@@ -76,9 +147,9 @@ class BlueAir(object):
         device. It can be stored and reused to avoid requesting it again when
         reinitializing the class at a later time.
         """
-        logger.debug(f"GET https://api.blueair.io/v2/user/{self.username}/homehost/")
+        logger.debug("GET https://api.blueair.io/v2/user/%s/homehost/", self.username)
 
-        response = requests.get(
+        response = self.transport.get(
             f"https://api.blueair.io/v2/user/{self.username}/homehost/",
             headers={"X-API-KEY-TOKEN": API_KEY},
         )
@@ -92,10 +163,10 @@ class BlueAir(object):
         The authentication token can be reused to prevent an additional network
         request when initializing the client.
         """
-        logger.debug(f"GET https://{self.home_host}/v2/user/{self.username}/login/")
+        logger.debug("GET %suser/%s/login/", self._api_url, self.username)
 
-        response = requests.get(
-            f"https://{self.home_host}/v2/user/{self.username}/login/",
+        response = self.transport.get(
+            f"{self._api_url}user/{self.username}/login/",
             headers={
                 "X-API-KEY-TOKEN": API_KEY,
                 "Authorization": "Basic "
@@ -107,17 +178,24 @@ class BlueAir(object):
 
         return response.headers["X-AUTH-TOKEN"]
 
+    def api_headers(self) -> Mapping[str, str]:
+        """
+        Return the headers that authenticate an API call.
+
+        The mapping is shared by all requests and must not be modified.
+        """
+        return self._api_headers
+
     def api_call(self, path: str) -> Any:
         """
         Perform a Blueair API call.
 
         This is a low level function that is used by most of the client API calls.
         """
-        logger.debug(f"GET https://{self.home_host}/v2/{path}")
+        logger.debug("GET %s%s", self._api_url, path)
 
-        return requests.get(
-            f"https://{self.home_host}/v2/{path}",
-            headers={"X-API-KEY-TOKEN": API_KEY, "X-AUTH-TOKEN": self.auth_token},
+        return self.transport.get(
+            self._api_url + path, headers=self._api_headers
         ).json()
 
     def get_devices(self) -> List[Dict[str, Any]]:
@@ -165,26 +243,31 @@ class BlueAir(object):
         """
         return self.api_call(f"device/{device_uuid}/info/")
 
-    def set_fan_speed(self, device_uuid, new_speed):
+    def set_attribute(self, device_uuid: str, name: str, value: Any) -> None:
         """
-        Set the fan speed per @spikeyGG comment at https://community.home-assistant.io/t/blueair-purifier-addon/154456/14
+        Set a device attribute.
+
+        This is a low level function that is used by set_fan_speed and
+        set_fan_mode.
         """
-        res = requests.post(
-            f"https://{self.home_host}/v2/device/{device_uuid}/attribute/fanspeed/",
-            headers={
-                "Content-Type": "application/json",
-                "X-API-KEY-TOKEN": API_KEY,
-                "X-AUTH-TOKEN": self.auth_token,
-            },
+        self.transport.post(
+            f"{self._api_url}device/{device_uuid}/attribute/{name.replace('_', '')}/",
+            headers=self._api_headers,
             json={
-                "currentValue": new_speed,
+                "currentValue": value,
                 "scope": "device",
-                "defaultValue": new_speed,
-                "name": "fan_speed",
+                "defaultValue": value,
+                "name": name,
                 "uuid": device_uuid,
             },
         )
 
+    def set_fan_speed(self, device_uuid, new_speed):
+        """
+        Set the fan speed per @spikeyGG comment at https://community.home-assistant.io/t/blueair-purifier-addon/154456/14
+        """
+        self.set_attribute(device_uuid, "fan_speed", new_speed)
+
     def set_fan_mode(self, device_uuid, new_mode):
         """
         Set the fan mode to automatic
@@ -192,21 +275,30 @@ class BlueAir(object):
         if new_mode == None:
             new_mode="manual"
 
-        res = requests.post(
-            f"https://{self.home_host}/v2/device/{device_uuid}/attribute/mode/",
-            headers={
-                "Content-Type": "application/json",
-                "X-API-KEY-TOKEN": API_KEY,
-                "X-AUTH-TOKEN": self.auth_token,
-            },
-            json={
-                "currentValue": new_mode,
-                "scope": "device",
-                "defaultValue": new_mode,
-                "name": "mode",
-                "uuid": device_uuid,
-            },
-        )
+        self.set_attribute(device_uuid, "mode", new_mode)
+
+    def set_attributes(
+        self, commands: Iterable[Tuple[str, str, Any]]
+    ) -> List[Optional[Exception]]:
+        """
+        Set attributes on many devices, one after the other.
+
+        Each command is a (device_uuid, attribute, value) tuple where the
+        attribute is either "fan_speed" or "mode". A failing command does not
+        stop the others; the return value holds the exception raised by each
+        command, or None when it succeeded, in the order the commands were
+        given. Callers wanting parallelism send several batches at once.
+        """
+        setters = {"fan_speed": self.set_fan_speed, "mode": self.set_fan_mode}
+        errors: List[Optional[Exception]] = []
+        for device_uuid, attribute, value in commands:
+            try:
+                setters[attribute](device_uuid, value)
+            except Exception as error:
+                errors.append(error)
+            else:
+                errors.append(None)
+        return errors
 
     # Note: refreshes every 5 minutes
     def get_current_data_point(
@@ -222,10 +314,37 @@ class BlueAir(object):
         Calling it more often will return the same respone from the server and
         should be avoided to limit server load.
         """
+        return self.get_latest_data_points(device_uuid)[-1]
+
+    # Note: refreshes every 5 minutes
+    def get_latest_data_points(self, device_uuid: str) -> MeasurementList:
+        """
+        Fetch the most recent data points for the provided device ID.
+
+        The last element is the sample that is still being collected, so its
+        values may change until its sample period has ended.
+        """
         data = self.api_call(f"device/{device_uuid}/datapoint/0/last/0/")
 
-        results = transform_data_points(data)
-        return results[-1]
+        return transform_data_points(data)
+
+    # Note: refreshes every 5 minutes
+    def get_data_points_after(
+        self, device_uuid: str, timestamp: int
+    ) -> MeasurementList:
+        """
+        Fetch the data points newer than the provided timestamp.
+
+        This is used to poll incrementally: pass the timestamp of the last
+        data point already seen to only transfer what is new. The last
+        element may be the sample that is still being collected.
+        """
+        end_timestamp = int(time.time())
+        data = self.api_call(
+            f"device/{device_uuid}/datapoint/{timestamp + 1}/{end_timestamp}/0/"
+        )
+
+        return transform_data_points(data)
 
     # Note: refreshes every 5 minutes
     def get_data_points_since(
@@ -247,11 +366,8 @@ class BlueAir(object):
 
         results = transform_data_points(data)
 
-        # Remove the last element because it does not have the final timestamp yet
-        # TODO: Only remove if it is equal to end_timestamp
-        results.pop()
-
-        return results
+        # Remove the last element if it does not have the final values yet
+        return drop_partial_data_point(results, int(time.time()), sample_period)
 
     # Setting sample_period to a value higher than 300 (the minimum sample
     # period) will cause measurements to be averaged. Leave the sample period
@@ -284,8 +400,82 @@ class BlueAir(object):
 
         results = transform_data_points(data)
 
-        # Remove the last element because it does not have the final timestamp yet
-        # TODO: Only remove if it is equal to end_timestamp
-        results.pop()
+        # Remove the last element if it does not have the final values yet
+        return drop_partial_data_point(results, end_timestamp, sample_period)
+
+    def iter_data_points_between(
+        self,
+        device_uuid: str,
+        start_timestamp: int,
+        end_timestamp: int,
+        sample_period: int = 0,
+    ) -> Iterator[Mapping[str, Union[int, float]]]:
+        """
+        Iterate over the data points between two timestamps.
 
-        return results
+        This returns the same data points as get_data_points_between, but
+        parses the response while it is being received and yields each data
+        point as soon as it is complete. Memory use stays flat regardless of
+        the length of the time range.
+        """
+        logger.debug(
+            "GET %sdevice/%s/datapoint/%s/%s/%s/ (streamed)",
+            self._api_url,
+            device_uuid,
+            start_timestamp,
+            end_timestamp,
+            sample_period,
+        )
+
+        with self.transport.get(
+            f"{self._api_url}device/{device_uuid}/datapoint/{start_timestamp}/{end_timestamp}/{sample_period}/",
+            headers=self._api_headers,
+            stream=True,
+        ) as response:
+            rows = iter_data_point_rows(
+                response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            )
+            keys = [SENSOR_KEY_MAPPING[key] for key in next(rows)]
+
+            # Hold one data point back so the partial last one can be dropped
+            previous = None
+            for values in rows:
+                if previous is not None:
+                    yield previous
+                previous = dict(zip(keys, values))
+
+            if previous is not None:
+                yield from drop_partial_data_point(
+                    [previous], end_timestamp, sample_period
+                )
+
+    def iter_data_point_columns_between(
+        self,
+        device_uuid: str,
+        start_timestamp: int,
+        end_timestamp: int,
+        sample_period: int = 0,
+        chunk_size: int = 1000,
+    ) -> Iterator[Dict[str, List[Union[int, float]]]]:
+        """
+        Iterate over the data points between two timestamps in column chunks.
+
+        Each chunk maps every measurement name to a list of at most chunk_size
+        values, which is the layout columnar writers and vectorised code
+        expect.
+        """
+        columns: Dict[str, List[Union[int, float]]] = {}
+        count = 0
+        for row in self.iter_data_points_between(
+            device_uuid, start_timestamp, end_timestamp, sample_period
+        ):
+            for key, value in row.items():
+                columns.setdefault(key, []).append(value)
+            count += 1
+            if count == chunk_size:
+                yield columns
+                columns = {}
+                count = 0
+
+        if count:
+            yield columns
@@ -2,9 +2,12 @@
 
 
 import logging
-from typing import Any, Dict, List
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping
 import requests
 import time
+
+from .transport import Transport
 # from urllib.parse import urlencode
 
 
@@ -33,8 +36,11 @@ class BlueAirAws(object):
         self,
         username: str,
         password: str,
-        region: str
+        region: str,
+        session: requests.Session = None,
+        transport: Transport = None,
     ) -> None:
+        self.transport = transport or Transport(session)
         self.username = username
         self.password = password
         self.region = region
@@ -45,15 +51,17 @@ class BlueAirAws(object):
         self.aws_api_key = BLUEAIR_AWS_APIKEYS[self.region]['apiKey']
         self.api_dns_name = f"{self.aws_rest_api_id}.execute-api.{self.aws_region}.amazonaws.com"
         self.api_url_prefix = f"https://{self.api_dns_name}"
+        self.api_url = f"{self.api_url_prefix}/prod/c/"
 
         self.token_expiration_time = 0
+        self._api_header: Mapping[str, str] = MappingProxyType({})
 
         self.login()
     
 
     def renew_token_if_expired(self) -> None:
         if time.time() > self.token_expiration_time:
-            self.login
+            self.login()
 
     def login(self) -> None:
 
@@ -67,7 +75,7 @@ class BlueAirAws(object):
             'Content-Type': 'application/x-www-form-urlencoded',
         }
 
-        response = requests.post(
+        response = self.transport.post(
             url= f"https://accounts.{self.gigya_region}.gigya.com/accounts.login",
             headers = gigya_headers,
             data = {
@@ -78,13 +86,13 @@ class BlueAirAws(object):
             }
         ).json()
 
-        logger.debug(f"Login response: {response}")
+        logger.debug("Login response: %s", response)
 
         session_token = response['sessionInfo']['sessionToken']
         session_secret = response['sessionInfo']['sessionSecret']
 
         # Get JWT Token
-        response = requests.post(
+        response = self.transport.post(
             url = f"https://accounts.{self.gigya_region}.gigya.com/accounts.getJWT",
             headers = gigya_headers,
             data = {
@@ -97,7 +105,7 @@ class BlueAirAws(object):
         jwt_token = response['id_token']
         
         # Use JWT Token to get Access Token for Execute API endpoints
-        response = requests.post(
+        response = self.transport.post(
             url = f"{self.api_url_prefix}/prod/c/login",
             headers = {
                 'Host': self.api_dns_name,
@@ -110,13 +118,13 @@ class BlueAirAws(object):
             },
         ).json()
 
-        logger.debug(f"AWS Login response: {response}")
+        logger.debug("AWS Login response: %s", response)
 
         self.access_token = response['access_token']
         self.token_expiration_time = time.time() + BLUEAIR_TOKEN_EXPIRATION_SECONDS
 
-    def api_header(self) -> Dict[str, str]:
-        return {
+        # Built once per token instead of for every request
+        self._api_header = MappingProxyType({
             'Host': self.api_dns_name,
             'Connection': 'keep-alive',
             'idtoken': self.access_token,
@@ -124,46 +132,53 @@ class BlueAirAws(object):
             'User-Agent': 'Blueair/58 CFNetwork/1327.0.4 Darwin/21.2.0',
             'Authorization': 'Bearer ' + self.access_token,
             'Accept-Language': 'en-US,en;q=0.9',
-        }
+        })
+
+    def api_header(self) -> Mapping[str, str]:
+        """Return the headers of the current token, shared by all requests."""
+        return self._api_header
+
+    def api_call(self, method: str, path: str, body: Any = None) -> Any:
+        """Perform an authenticated call to the Execute API endpoints."""
+        logger.debug("%s %s%s", method, self.api_url, path)
+
+        return self.transport.request(
+            method, self.api_url + path, headers=self._api_header, json=body
+        ).json()
 
     def get_devices(self) -> List[Dict[str, Any]]:
         self.renew_token_if_expired()
 
-        return requests.get(
-            url = f"{self.api_url_prefix}/prod/c/registered-devices",
-            headers = self.api_header()
-        ).json()
+        return self.api_call('GET', 'registered-devices')
     
 
     def get_info(self, device_name: str, device_uuid: str) -> Dict[str, Any]:
         self.renew_token_if_expired()
         
-        return requests.post(
-            url = f"{self.api_url_prefix}/prod/c/{device_name}/r/initial",
-            headers= self.api_header() | {'Content-Type': 'application/json'},
-            json = {
-                'deviceconfigquery': [
+        body = {
+            'deviceconfigquery': [
+                {
+                    'id': device_uuid,
+                    'r': {
+                        'r': [
+                            'sensors',
+                        ],
+                    },
+                },
+            ],
+            'includestates': True,
+            'eventsubscription': {
+                'include': [
                     {
-                        'id': device_uuid,
-                        'r': {
-                            'r': [
-                                'sensors',
-                            ],
+                        'filter': {
+                            'o': '= ' + device_uuid,
                         },
                     },
                 ],
-                'includestates': True,
-                'eventsubscription': {
-                    'include': [
-                        {
-                            'filter': {
-                                'o': '= ' + device_uuid,
-                            },
-                        },
-                    ],
-                },
-            }
-        ).json()['deviceInfo']
+            },
+        }
+
+        return self.api_call('POST', f"{device_name}/r/initial", body)['deviceInfo']
     
 
     def send_command(self, decvice_uuid: str, service: str, action_verb: str, action_value: any):
@@ -180,8 +195,4 @@ class BlueAirAws(object):
                 'v': action_value,
             }
 
-        return requests.post(
-            url = f"{self.api_url_prefix}/prod/c/{decvice_uuid}/a/{service}",
-            headers= self.api_header() | {'Content-Type': 'application/json'},
-            json = body
-        ).json()
+        return self.api_call('POST', f"{decvice_uuid}/a/{service}", body)
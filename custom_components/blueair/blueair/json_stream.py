@@ -0,0 +1,119 @@
+"""This module provides an incremental parser for Blueair datapoint responses."""
+
+import codecs
+import json
+
+from typing import Any, Iterable, Iterator, List, Optional
+
+_WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+    """A growing text buffer fed from an iterable of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._eof = False
+        self.buffer = ""
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """Read the next chunk, dropping what has already been consumed."""
+        if self._eof:
+            return False
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+        self.buffer += self._decoder.decode(b"", final=True)
+        self._eof = True
+        return bool(self.buffer)
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, character: str) -> None:
+        """Consume the next non-whitespace character, which must match."""
+        if self.peek() != character:
+            raise ValueError(
+                f"Expected {character!r} at offset {self.pos}, got {self.buffer[self.pos]!r}"
+            )
+        self.pos += 1
+
+    def skip(self, character: str) -> bool:
+        """Consume the next non-whitespace character if it matches."""
+        if self.peek() == character:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self) -> Any:
+        """Decode one complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_data_point_rows(
+    chunks: Iterable[bytes],
+) -> Iterator[Any]:
+    """
+    Parse a datapoint response incrementally.
+
+    The first value yielded is the list of sensor names, followed by each row
+    of the datapoints array as soon as it has been received. Only one row is
+    held in memory at a time, unless the server sends the datapoints before
+    the sensor names, in which case the rows are buffered until the names
+    are known.
+    """
+    reader = _Reader(chunks)
+    sensors: Optional[List[str]] = None
+    buffered: List[List[Any]] = []
+
+    reader.expect("{")
+    while not reader.skip("}"):
+        key = reader.value()
+        reader.expect(":")
+        if key == "datapoints":
+            reader.expect("[")
+            while not reader.skip("]"):
+                row = reader.value()
+                if sensors is None:
+                    buffered.append(row)
+                else:
+                    yield row
+                reader.skip(",")
+        elif key == "sensors":
+            sensors = reader.value()
+            yield sensors
+            yield from buffered
+            buffered = []
+        else:
+            reader.value()
+        reader.skip(",")
+
+    if sensors is None:
+        raise ValueError("Datapoint response has no sensors")
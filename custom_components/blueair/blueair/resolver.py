@@ -0,0 +1,134 @@
+"""This module caches the DNS lookups of the Blueair clients."""
+
+import logging
+import socket
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class DnsCache(object):
+    """
+    Cache the addresses of the hosts the clients connect to.
+
+    The system resolver doesn't report the TTL of the records it returns,
+    so addresses are kept for a fixed ttl that is in line with the TTLs of
+    the Blueair hosts. All addresses of a host are kept, in the order the
+    resolver returned them, so connections can fall back to the next one.
+    An address is forgotten early when connecting to it fails, and used
+    past its ttl when looking the host up again fails, so a resolver hiccup
+    doesn't fail requests to a host that still works.
+    """
+
+    def __init__(self, ttl: float = 300) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.lookups = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    def resolve(self, host: str, port: int) -> List[str]:
+        """
+        Return the addresses to try in turn to connect to a host.
+
+        The host itself is returned when it can't be resolved, so the
+        connection looks it up again and reports the error as usual.
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] > now:
+                self.hits += 1
+                return list(cached[1])
+            self.lookups += 1
+
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as error:
+            if cached is None:
+                return [host]
+            logger.debug("Looking up %s failed, using %s: %s", host, cached[1], error)
+            return list(cached[1])
+
+        # Every address is listed once per protocol and socket type
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addresses)
+        return list(addresses)
+
+    def forget(self, host: str, port: int, address: str) -> None:
+        """Drop an address of a host, the host once none is left."""
+        key = (host, port)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or address not in cached[1]:
+                return
+            addresses = [other for other in cached[1] if other != address]
+            if addresses:
+                self._entries[key] = (cached[0], addresses)
+            else:
+                del self._entries[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the cached hosts and how often the cache answered."""
+        with self._lock:
+            return {
+                "hosts": sorted({host for host, _ in self._entries}),
+                "hits": self.hits,
+                "lookups": self.lookups,
+            }
+
+
+def _resolving_pool(
+    pool_cls: Type[HTTPConnectionPool],
+    connection_cls: Type[HTTPConnection],
+    cache: DnsCache,
+) -> Type[HTTPConnectionPool]:
+    """Return a connection pool class whose connections use the cache."""
+
+    class ResolvingConnection(connection_cls):  # type: ignore[valid-type,misc]
+        def _new_conn(self) -> socket.socket:
+            # Only the address connected to changes, TLS still verifies and
+            # sends the host name. Addresses are tried in turn like
+            # socket.create_connection does, the last error is raised.
+            host = self._dns_host
+            error: Optional[Exception] = None
+            try:
+                for address in cache.resolve(host, self.port):
+                    self._dns_host = address
+                    try:
+                        return super()._new_conn()
+                    except Exception as address_error:
+                        cache.forget(host, self.port, address)
+                        error = address_error
+                raise error
+            finally:
+                self._dns_host = host
+
+    return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": ResolvingConnection})
+
+
+class DnsCachingAdapter(HTTPAdapter):
+    """A requests adapter whose connections resolve hosts through a DnsCache."""
+
+    def __init__(self, cache: DnsCache, **kwargs: Any) -> None:
+        # Set before the base class creates the pool manager
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _resolving_pool(HTTPConnectionPool, HTTPConnection, self.cache),
+            "https": _resolving_pool(
+                HTTPSConnectionPool, HTTPSConnection, self.cache
+            ),
+        }
@@ -0,0 +1,398 @@
+"""This module provides the HTTP transport shared by the Blueair clients."""
+
+import base64
+import json
+import logging
+import re
+import threading
+import time
+
+from collections import defaultdict, deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Seconds a connection may take to warm up before it is given up
+WARM_UP_TIMEOUT = 5
+# Seconds to connect and between received bytes of requests without a
+# timeout of their own, so a hung connection frees its thread
+REQUEST_TIMEOUT = (3.05, 6)
+
+
+class Request(object):
+    """An HTTP request on its way through the middleware chain."""
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self.method = method
+        self.url = url
+        # Clients share prebuilt header mappings between requests, so
+        # middleware must replace this rather than modify it in place
+        self.headers: Mapping[str, str] = headers or {}
+        # Passed on to requests as is, e.g. json, data, timeout and stream
+        self.kwargs = kwargs
+
+
+# Datapoint URLs contain the current time, which differs between runs
+_TIMESTAMP_SEGMENT = re.compile(r"(?<=/)\d{9,}(?=/)")
+# Account URLs contain the username
+_USERNAME_SEGMENT = re.compile(r"(/(?:user|owner)/)[^/]+")
+# Headers carrying credentials, the login returns its token in one
+_SECRET_HEADERS = {"authorization", "x-api-key-token", "x-auth-token", "set-cookie"}
+
+Handler = Callable[[Request], requests.Response]
+Middleware = Callable[[Request, Handler], requests.Response]
+
+
+class Transport(object):
+    """
+    This class sends the HTTP requests of the Blueair clients.
+
+    Every request passes through the middleware in the order given, the
+    last one hands it to the requests session. A middleware is any callable
+    taking the request and the next handler, so it can change the request,
+    answer it without calling the next handler, or look at the response.
+    Requests without a timeout get REQUEST_TIMEOUT.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session = None,
+        middleware: Iterable[Middleware] = (),
+    ) -> None:
+        self.session = session or requests.Session()
+        self.middleware: List[Middleware] = list(middleware)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send a request through the middleware chain."""
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        handler: Handler = self._send
+        for middleware in reversed(self.middleware):
+            handler = self._wrap(middleware, handler)
+        return handler(Request(method, url, headers, **kwargs))
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """Send a GET request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        """Send a POST request."""
+        return self.request("POST", url, **kwargs)
+
+    def warm_up(self, url: str) -> None:
+        """
+        Open a connection to the host of url ahead of the first request.
+
+        A HEAD request resolves the host and completes the TLS handshake,
+        after which its connection waits in the pool of the session. It
+        bypasses the middleware and its answer is ignored, failures only
+        mean the first request opens the connection itself.
+        """
+        try:
+            self.session.head(url, timeout=WARM_UP_TIMEOUT, allow_redirects=False)
+        except requests.RequestException as error:
+            logger.debug("Warming up a connection to %s failed: %s", url, error)
+
+    @staticmethod
+    def _wrap(middleware: Middleware, call_next: Handler) -> Handler:
+        return lambda request: middleware(request, call_next)
+
+    def _send(self, request: Request) -> requests.Response:
+        return self.session.request(
+            request.method, request.url, headers=request.headers, **request.kwargs
+        )
+
+
+def build_response(
+    url: str, status_code: int, headers: Dict[str, str], content: bytes
+) -> requests.Response:
+    """Build a response that was not received from the network."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = "utf-8"
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+class RetryMiddleware(object):
+    """Retry requests that failed with a connection error or a server error."""
+
+    def __init__(
+        self,
+        retries: int = 2,
+        backoff: float = 0.5,
+        methods: Tuple[str, ...] = ("GET",),
+        statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+    ) -> None:
+        self.retries = retries
+        self.backoff = backoff
+        self.methods = methods
+        self.statuses = statuses
+
+    def __call__(self, request: Request, call_next: Handler) -> requests.Response:
+        if request.method not in self.methods:
+            return call_next(request)
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = call_next(request)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if last_attempt or response.status_code not in self.statuses:
+                    return response
+            delay = self.backoff * 2**attempt
+            logger.debug("Retrying %s %s in %.1fs", request.method, request.url, delay)
+            time.sleep(delay)
+
+
+class MetricsMiddleware(object):
+    """
+    Count requests, errors, time and received bytes per host.
+
+    Bytes are counted as read from the connection, which is compressed
+    when the server compressed the response, and as decoded. Streamed
+    responses are read by the caller after this middleware is done, so
+    their bytes are counted once they are closed, and their decoded size
+    isn't known and counts as received.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {
+                "requests": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "bytes": 0,
+                "decoded_bytes": 0,
+            }
+        )
+
+    def __call__(self, request: Request, call_next: Handler) -> requests.Response:
+        start = time.monotonic()
+        response = None
+        try:
+            response = call_next(request)
+            return response
+        finally:
+            elapsed = time.monotonic() - start
+            host = urlsplit(request.url).hostname or ""
+            with self._lock:
+                metrics = self._metrics[host]
+                metrics["requests"] += 1
+                metrics["seconds"] += elapsed
+                if response is None or response.status_code >= 400:
+                    metrics["errors"] += 1
+            if response is not None:
+                if request.kwargs.get("stream"):
+                    self._count_when_closed(host, response)
+                else:
+                    self._count(host, _received(response), len(response.content))
+
+    def _count(self, host: str, received: int, decoded: int) -> None:
+        with self._lock:
+            self._metrics[host]["bytes"] += received
+            self._metrics[host]["decoded_bytes"] += decoded
+
+    def _count_when_closed(self, host: str, response: requests.Response) -> None:
+        close = response.close
+
+        def count_and_close() -> None:
+            response.close = close
+            received = _received(response)
+            self._count(host, received, received)
+            close()
+
+        response.close = count_and_close
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return a copy of the metrics."""
+        with self._lock:
+            return {host: dict(metrics) for host, metrics in self._metrics.items()}
+
+
+def _received(response: requests.Response) -> int:
+    """Return the bytes read from the connection for a response."""
+    if response.raw is not None and hasattr(response.raw, "tell"):
+        return response.raw.tell()
+    # Responses built from a fixture or a cache count their body
+    return len(response.content)
+
+
+class TracingMiddleware(object):
+    """
+    Trace every request as a span of an OpenTelemetry compatible tracer.
+
+    The endpoint attribute is the URL path with timestamps replaced, so
+    spans of the same call can be grouped. Retries made by middleware after
+    this one are part of the same span.
+    """
+
+    def __init__(self, tracer: Any) -> None:
+        self.tracer = tracer
+
+    def __call__(self, request: Request, call_next: Handler) -> requests.Response:
+        url = urlsplit(request.url)
+        attributes = {
+            "http.request.method": request.method,
+            "server.address": url.hostname or "",
+            "blueair.endpoint": _TIMESTAMP_SEGMENT.sub("{timestamp}", url.path),
+        }
+        with self.tracer.start_as_current_span(
+            f"{request.method} {url.hostname}", attributes=attributes
+        ) as span:
+            response = call_next(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            return response
+
+
+class CacheMiddleware(object):
+    """
+    Serve repeated GET requests from memory for a while.
+
+    Most Blueair data only changes every five minutes, so a cache with a
+    matching time to live saves requests when several callers ask for the
+    same thing. Streamed requests are not cached.
+    """
+
+    def __init__(self, ttl: float = 300) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[Any, ...], Tuple[float, requests.Response]] = {}
+
+    def __call__(self, request: Request, call_next: Handler) -> requests.Response:
+        if request.method != "GET" or request.kwargs.get("stream"):
+            return call_next(request)
+
+        key = (request.url, tuple(sorted(request.headers.items())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and cached[0] > now:
+            response = cached[1]
+            return build_response(
+                response.url,
+                response.status_code,
+                dict(response.headers),
+                response.content,
+            )
+
+        response = call_next(request)
+        if response.status_code == 200:
+            with self._lock:
+                for expired in [k for k, v in self._entries.items() if v[0] <= now]:
+                    del self._entries[expired]
+                self._entries[key] = (now + self.ttl, response)
+        return response
+
+
+class RecordMiddleware(object):
+    """
+    Append every exchange to a fixture file for later replay.
+
+    The file holds one JSON object per line. Request headers are not
+    recorded, and response headers carrying credentials, like the token
+    returned by the login, are recorded as REDACTED so a replayed login
+    still finds them. Usernames in URLs are replaced by {username}.
+    Response bodies are recorded as is and may contain account details.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, request: Request, call_next: Handler) -> requests.Response:
+        response = call_next(request)
+        record = {
+            "method": request.method,
+            "url": _USERNAME_SEGMENT.sub(r"\1{username}", request.url),
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            # Reading the content keeps it available to streaming callers
+            "content": base64.b64encode(response.content).decode(),
+        }
+        # The body is stored decoded, so the encoding no longer applies
+        record["headers"].pop("Content-Encoding", None)
+        record["headers"]["Content-Length"] = str(len(response.content))
+        for name in list(record["headers"]):
+            if name.lower() in _SECRET_HEADERS:
+                record["headers"][name] = "REDACTED"
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+        return response
+
+
+class ReplayMiddleware(object):
+    """
+    Answer requests from a fixture file written by RecordMiddleware.
+
+    Responses for the same method and URL are returned in the order they
+    were recorded, and the last one keeps being returned once they run out,
+    so a short recording can drive an arbitrarily long run. Timestamps in
+    URLs are ignored when matching, as are usernames, so a fixture recorded
+    with one account replays for any. Requests that were never recorded fail
+    instead of reaching the network.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._responses: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(
+            deque
+        )
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    key = self._key(record["method"], record["url"])
+                    self._responses[key].append(record)
+
+    @staticmethod
+    def _key(method: str, url: str) -> Tuple[str, str]:
+        url = _USERNAME_SEGMENT.sub(r"\1{username}", url)
+        return method, _TIMESTAMP_SEGMENT.sub("{timestamp}", url)
+
+    def __call__(self, request: Request, call_next: Handler) -> requests.Response:
+        with self._lock:
+            records = self._responses.get(self._key(request.method, request.url))
+            if not records:
+                raise requests.ConnectionError(
+                    f"No recorded response for {request.method} {request.url}"
+                )
+            record = records.popleft() if len(records) > 1 else records[0]
+        return build_response(
+            request.url,
+            record["status"],
+            record["headers"],
+            base64.b64decode(record["content"]),
+        )
@@ -0,0 +1,162 @@
+"""This module polls Blueair devices in a separate process."""
+
+import logging
+import marshal
+import time
+
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Tuple
+
+from .blueair import BlueAir
+
+logger = logging.getLogger(__name__)
+
+# Messages are tuples serialized with marshal, which is compact, fast and
+# only used between this process and the one that started it.
+#
+# To the worker:
+#   ("devices", {device_uuid: cursor})  poll these devices from now on
+#   ("stop",)                           exit
+#
+# From the worker:
+#   ("update", device_uuid, info_changes, attribute_changes, keys, rows)
+#   ("error", device_uuid, message)
+#
+# Changes only hold the keys that changed since the previous update of the
+# device, removed keys have the value None. The first update of a device
+# after the worker started holds everything. Datapoint rows are sent as
+# tuples of values in the order of keys.
+
+
+def encode(message: Tuple[Any, ...]) -> bytes:
+    """Serialize a message."""
+    return marshal.dumps(message)
+
+
+def decode(data: bytes) -> Tuple[Any, ...]:
+    """Deserialize a message."""
+    return marshal.loads(data)
+
+
+def _changes(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the keys of new that differ from old, and removed keys as None."""
+    changes = {key: value for key, value in new.items() if old.get(key) != value}
+    changes.update({key: None for key in old.keys() - new.keys()})
+    return changes
+
+
+class Poller(object):
+    """
+    Poll devices evenly spread over the interval and report changes.
+
+    The cursor of a device is the timestamp datapoints are fetched after. It
+    is kept one second before the newest datapoint, so a sample that was
+    still being collected is fetched again with its final values.
+    """
+
+    def __init__(
+        self, client: BlueAir, cursors: Dict[str, Optional[int]], interval: float
+    ) -> None:
+        self.client = client
+        self.interval = interval
+        self.cursors: Dict[str, Optional[int]] = {}
+        self.due: Dict[str, float] = {}
+        self.info: Dict[str, Dict[str, Any]] = {}
+        self.attributes: Dict[str, Dict[str, Any]] = {}
+        self.set_devices(cursors)
+
+    def set_devices(self, cursors: Dict[str, Optional[int]]) -> None:
+        """Poll the given devices, keeping the state of known ones."""
+        now = time.time()
+        for device_uuid in list(self.cursors):
+            if device_uuid not in cursors:
+                del self.cursors[device_uuid]
+                del self.due[device_uuid]
+                self.info.pop(device_uuid, None)
+                self.attributes.pop(device_uuid, None)
+        for index, (device_uuid, cursor) in enumerate(sorted(cursors.items())):
+            if device_uuid not in self.cursors:
+                self.cursors[device_uuid] = cursor
+                self.due[device_uuid] = now + index / len(cursors) * self.interval
+
+    def next_due(self) -> Tuple[Optional[str], float]:
+        """Return the device to poll next and when."""
+        if not self.due:
+            return None, time.time() + self.interval
+        device_uuid = min(self.due, key=self.due.__getitem__)
+        return device_uuid, self.due[device_uuid]
+
+    def poll(self, device_uuid: str) -> Tuple[Any, ...]:
+        """Poll a device and return the message reporting it."""
+        self.due[device_uuid] += self.interval
+        info = self.client.get_info(device_uuid)
+
+        keys: List[str] = []
+        rows: List[Tuple[Any, ...]] = []
+        cursor = self.cursors[device_uuid]
+        try:
+            # Classics will not have the expected data here
+            if cursor is None:
+                datapoints = self.client.get_latest_data_points(device_uuid)
+            else:
+                datapoints = self.client.get_data_points_after(device_uuid, cursor)
+        except Exception as error:
+            logger.debug("No datapoints for %s: %s", device_uuid, error)
+            datapoints = []
+        if datapoints:
+            keys = list(datapoints[0])
+            rows = [tuple(row.get(key) for key in keys) for row in datapoints]
+            self.cursors[device_uuid] = datapoints[-1]["timestamp"] - 1
+
+        attributes = self.client.get_attributes(device_uuid)
+
+        message = (
+            "update",
+            device_uuid,
+            _changes(self.info.get(device_uuid, {}), info),
+            _changes(self.attributes.get(device_uuid, {}), attributes),
+            keys,
+            rows,
+        )
+        self.info[device_uuid] = info
+        self.attributes[device_uuid] = attributes
+        return message
+
+
+def run(
+    conn: Connection,
+    username: str,
+    password: str,
+    home_host: str,
+    auth_token: str,
+    cursors: Dict[str, Optional[int]],
+    interval: float,
+) -> None:
+    """
+    Poll devices until told to stop, this is the worker process entry point.
+
+    The session of the parent process is reused through the home host and
+    authentication token, so starting a worker doesn't log in again.
+    """
+    client = BlueAir(username, password, home_host=home_host, auth_token=auth_token)
+    poller = Poller(client, cursors, interval)
+
+    while True:
+        device_uuid, due = poller.next_due()
+        if conn.poll(max(0.0, due - time.time())):
+            message = decode(conn.recv_bytes())
+            if message[0] == "stop":
+                return
+            if message[0] == "devices":
+                poller.set_devices(message[1])
+            continue
+        if device_uuid is None:
+            continue
+
+        try:
+            conn.send_bytes(encode(poller.poll(device_uuid)))
+        except (BrokenPipeError, EOFError):
+            # The parent is gone
+            return
+        except Exception as error:
+            conn.send_bytes(encode(("error", device_uuid, str(error))))
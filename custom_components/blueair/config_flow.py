@@ -1,4 +1,7 @@
 """Config flow for blueair integration."""
+from functools import partial
+import time
+
 import voluptuous as vol
 from . import blueair
 
@@ -7,7 +10,14 @@ from homeassistant import config_entries, core, exceptions
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DOMAIN, LOGGER
+from .const import (
+    CONF_AUTH_TOKEN,
+    CONF_DEVICES,
+    CONF_HOME_HOST,
+    CONF_VALIDATED_AT,
+    DOMAIN,
+    LOGGER,
+)
 
 DATA_SCHEMA = vol.Schema({vol.Required("username"): str, vol.Required("password"): str})
 
@@ -15,24 +25,37 @@ DATA_SCHEMA = vol.Schema({vol.Required("username"): str, vol.Required("password"
 async def validate_input(hass: core.HomeAssistant, data):
     """Validate the user input allows us to connect.
     Data has the keys from DATA_SCHEMA with values provided by the user.
+
+    The login is done with the client the entry runs on, and its home host,
+    token and device list are returned as session so the entry setup can
+    resume from it instead of logging in again.
     """
 
     session = async_get_clientsession(hass)
     try:
         client = await hass.async_add_executor_job(
-            lambda: blueair.BlueAirAws(
+            partial(
+                blueair.BlueAir,
                 username=data[CONF_USERNAME],
                 password=data[CONF_PASSWORD],
-                region='us'
             )
         )
         LOGGER.debug(f"Connecting as {data[CONF_USERNAME]}")
+        devices = await hass.async_add_executor_job(client.get_devices)
     except KeyError as e:
         raise InvalidAuth(f"BlueAir authorization failed")
     except Exception as e:
         raise CannotConnect()
 
-    return {"title": f"BlueAir {data[CONF_USERNAME]}"}
+    return {
+        "title": f"BlueAir {data[CONF_USERNAME]}",
+        "session": {
+            CONF_HOME_HOST: client.home_host,
+            CONF_AUTH_TOKEN: client.auth_token,
+            CONF_DEVICES: devices,
+            CONF_VALIDATED_AT: time.time(),
+        },
+    }
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -48,7 +71,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             self._abort_if_unique_id_configured()
             try:
                 info = await validate_input(self.hass, user_input)
-                return self.async_create_entry(title=info["title"], data=user_input)
+                return self.async_create_entry(
+                    title=info["title"], data={**user_input, **info["session"]}
+                )
             except CannotConnect:
                 errors["base"] = "cannot_connect"
             except InvalidAuth:
@@ -3,5 +3,20 @@ import logging
 
 LOGGER = logging.getLogger(__package__)
 
+ANALYTICS = "analytics"
+ATTR_DATA_AGE = "data_age"
 CLIENT = "client"
+CONF_AUTH_TOKEN = "auth_token"
+CONF_DEVICES = "devices"
+CONF_HOME_HOST = "home_host"
+CONF_VALIDATED_AT = "validated_at"
 DOMAIN = "blueair"
+EVENT_DEVICE_UPDATE = "blueair_device_update"
+FLEET = "fleet"
+HISTORY_CACHE = "history_cache"
+MIDDLEWARE = "middleware"
+SIGNAL_ADD_DEVICES = "blueair_add_devices"
+SIGNAL_SHEDDING = "blueair_shedding"
+SNAPSHOTS = "snapshots"
+TRACER = "tracer"
+WORKER = "worker"
@@ -0,0 +1,88 @@
+"""Local automatic fan control for Blueair devices."""
+
+from __future__ import annotations
+
+from collections import deque
+
+# PM2.5 levels in µg/m³ that call for one more fan speed, the US EPA AQI
+# breakpoints of moderate, unhealthy for sensitive groups, unhealthy and
+# very unhealthy air
+PM25_STEPS = (12.0, 35.5, 55.5, 150.5)
+# Same for VOC in ppb
+VOC_STEPS = (250.0, 500.0, 1000.0, 2000.0)
+# A step is only left downwards once the level fell this far below it
+HYSTERESIS = 0.2
+# Seconds the fan keeps a speed before it may step down
+MIN_DWELL = 600
+# At most this many commands per window of seconds
+MAX_COMMANDS = 6
+RATE_WINDOW = 3600
+
+
+def _level(value: float | None, steps: tuple[float, ...], current: int) -> int:
+    """Return how many steps a value reached, staying at current if in the band.
+
+    Leaving a step downwards needs the value to fall HYSTERESIS below it, so
+    a reading hovering around a step doesn't toggle the speed.
+    """
+    if value is None:
+        return 0
+    level = sum(value >= step for step in steps)
+    if level >= current:
+        return level
+    return min(current, sum(value >= step * (1 - HYSTERESIS) for step in steps))
+
+
+class FanController:
+    """Picks fan speeds from the air quality like a thermostat.
+
+    The lowest speed runs in clean air and every PM2.5 or VOC step reached
+    adds one, whichever pollutant is worse decides. Speeds go up as soon as
+    the air gets worse, and down one at a time once the air stayed better
+    for MIN_DWELL. No more than MAX_COMMANDS changes happen per RATE_WINDOW,
+    so a noisy sensor can't flood the device with commands.
+    """
+
+    def __init__(self) -> None:
+        """Initialize a controller that didn't change anything yet."""
+        self.speed: int | None = None
+        self.changed_at: float | None = None
+        self._commands: deque[float] = deque()
+
+    def target(
+        self, speed: int, speed_count: int, pm25: float | None, voc: float | None
+    ) -> int:
+        """Return the speed the air quality calls for at the current speed."""
+        current = max(speed - 1, 0)
+        level = max(
+            _level(pm25, PM25_STEPS, current), _level(voc, VOC_STEPS, current)
+        )
+        return min(level + 1, speed_count)
+
+    def next_speed(
+        self,
+        speed: int,
+        speed_count: int,
+        pm25: float | None,
+        voc: float | None,
+        now: float,
+    ) -> int | None:
+        """Return the speed to set now, or None to leave the fan alone."""
+        target = self.target(speed, speed_count, pm25, voc)
+        if target == speed:
+            return None
+        while self._commands and self._commands[0] <= now - RATE_WINDOW:
+            self._commands.popleft()
+        if len(self._commands) >= MAX_COMMANDS:
+            return None
+        if target < speed:
+            if self.changed_at is not None and now - self.changed_at < MIN_DWELL:
+                return None
+            target = speed - 1
+        return target
+
+    def record(self, speed: int, now: float) -> None:
+        """Remember a speed that was set."""
+        self.speed = speed
+        self.changed_at = now
+        self._commands.append(now)
@@ -1,51 +1,252 @@
 """Blueair device object."""
 
 import asyncio
-from asyncio import timeout
-from datetime import timedelta
+import math
+import time
 from typing import Any
 
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import suppress
 from homeassistant.helpers.device_registry import format_mac
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util.percentage import (
+    percentage_to_ranged_value,
+    ranged_value_to_percentage,
+)
 
 from . import blueair
-from .const import DOMAIN, LOGGER
+from .archive import TimeSeriesArchive, archive_path
+from .blueair.blueair import DEFAULT_SAMPLE_PERIOD
+from .const import DOMAIN, EVENT_DEVICE_UPDATE, LOGGER
+from .controller import FanController
+from .fleet import POLL_INTERVAL, BlueairFleet
+from .forecast import SEED_SECONDS, FilterForecast
+from .history import DatapointHistory
+from .tracing import span
 
 API = blueair.BlueAir
 
+# Speeds of the classic models, devices reporting higher speeds get more
+DEFAULT_SPEED_COUNT = 3
+# Speeds of known models by the compatibility reported in their information,
+# so a model with more speeds offers them before it first runs the highest
+MODEL_SPEED_COUNTS: dict[str, int] = {
+    "classic_280i": 3,
+    "classic_605": 3,
+}
+# Preset modes every device with modes supports, night is added once seen
+DEFAULT_PRESET_MODES = ("auto",)
+NIGHT_MODE = "night"
+# Preset of devices with sensors, where the integration picks the speed
+LOCAL_AUTO_MODE = "local_auto"
+# Attributes are refreshed by the API every five minutes, so polls keep
+# reporting the old mode and speed for up to that long after a command
+ATTRIBUTE_REFRESH_SECONDS = 300
+# A mode or speed differing from what local auto set this long ago was
+# changed by someone else
+COMMAND_SETTLE_SECONDS = ATTRIBUTE_REFRESH_SECONDS + POLL_INTERVAL.total_seconds()
+# Missing history is fetched one page per fleet job, at most CATCH_UP_PAGES
+# pages per poll, so seeding a month doesn't hold the fleet for long
+CATCH_UP_PAGE = 86400
+CATCH_UP_PAGES = 7
+# Seconds to wait after a failed catch-up, doubled after every failure
+CATCH_UP_RETRY = 300
+CATCH_UP_MAX_RETRY = 6 * 3600
+
 
 class BlueairDataUpdateCoordinator(DataUpdateCoordinator):
     """Blueair device object."""
 
     def __init__(
-        self, hass: HomeAssistant, api_client: API, uuid: str, device_name: str
+        self,
+        hass: HomeAssistant,
+        api_client: API,
+        uuid: str,
+        device_name: str,
+        fleet: BlueairFleet,
+        account: str,
     ) -> None:
         """Initialize the device."""
         self.hass: HomeAssistant = hass
         self.api_client: API = api_client
+        self.fleet: BlueairFleet = fleet
+        self._account: str = account
         self._uuid: str = uuid
         self._name: str = device_name
         self._manufacturer: str = "BlueAir"
         self._device_information: dict[str, Any] = {}
         self._datapoint: dict[str, Any] = {}
         self._attribute: dict[str, Any] = {}
+        self._history = DatapointHistory()
+        self._archive = TimeSeriesArchive(archive_path(hass, account, uuid))
+        # The archive only takes polled datapoints once it caught up with them
+        self._archive_synced: bool = False
+        # Opening happens in the executor, closing for good waits for it
+        self._archive_opening: asyncio.Future | None = None
+        self._archive_closed: bool = False
+        self._forecast = FilterForecast()
+        # Progress of fetching missing history, kept across polls and failures
+        self._catch_up_position: int | None = None
+        self._catch_up_rows: list[dict[str, Any]] = []
+        self._catch_up_retry_at: float = 0.0
+        self._catch_up_delay: float = CATCH_UP_RETRY
+        # Catching up runs beside the polls, one task at a time
+        self._catch_up_task: asyncio.Task | None = None
+        self._filter_remaining_days: float | None = None
+        self._analytics: dict[str, Any] | None = None
+        self._last_success: float | None = None
+        self._stale: bool = False
+        self._speed_count: int = DEFAULT_SPEED_COUNT
+        self._percentages: tuple[int, ...] = self._build_percentages()
+        self._preset_modes: list[str] = list(DEFAULT_PRESET_MODES)
+        self._local_auto: bool = False
+        self._local_auto_started: float = 0.0
+        self._controller = FanController()
+        # Fields as of the last update event, so optimistic changes are
+        # still reported once a refresh confirms them
+        self._published: dict[str, Any] = {}
 
         super().__init__(
             hass,
             LOGGER,
             name=f"{DOMAIN}-{device_name}",
-            update_interval=timedelta(seconds=60),
+            # Polling is driven by the fleet so accounts can be staggered
+            update_interval=None,
         )
 
     async def _async_update_data(self):
         """Update data via library."""
         try:
-            async with timeout(10):
-                await asyncio.gather(*[self._update_device()])
+            with span(self.hass, "blueair.refresh", self._span_attributes()):
+                await self._update_device()
         except Exception as error:
-            raise UpdateFailed(error) from error
+            if self._last_success is None:
+                raise UpdateFailed(error) from error
+            self.serve_stale(error)
+            return
+        self._last_success = time.time()
+        self._stale = False
+        self._fire_update_event()
+        self._schedule_control()
+
+    def serve_stale(self, error: Any) -> None:
+        """Keep serving the last good data, the next poll revalidates it."""
+        if not self._stale:
+            LOGGER.warning(
+                "Error refreshing %s, serving last known state: %s",
+                self._name,
+                error,
+            )
+        self._stale = True
+        self.async_update_listeners()
+
+    async def async_apply_update(
+        self,
+        info_changes: dict[str, Any],
+        attribute_changes: dict[str, Any],
+        rows: list[dict[str, Any]],
+    ) -> None:
+        """Apply the changes a worker process polled for the device."""
+        _apply_changes(self._device_information, info_changes)
+        self._extend_history(rows)
+        filter_status = self.filter_status
+        _apply_changes(self._attribute, attribute_changes)
+        self._learn_capabilities()
+        self._update_forecast(filter_status)
+        self._last_success = time.time()
+        self._stale = False
+        self._fire_update_event()
+        self.async_set_updated_data(None)
+        self._schedule_control()
+
+    def _fields(self) -> dict[str, Any]:
+        """Return the datapoint and attribute fields reported in events."""
+        fields = {**self._datapoint, **self._attribute}
+        fields.pop("timestamp", None)
+        return fields
+
+    def _fire_update_event(self) -> None:
+        """Fire one event with the fields that changed since the last one.
+
+        Fields that disappeared are reported as None. Nothing is fired when
+        nothing changed.
+        """
+        fields = self._fields()
+        changes = {
+            key: value
+            for key, value in fields.items()
+            if key not in self._published or self._published[key] != value
+        }
+        changes.update(
+            {key: None for key in self._published.keys() - fields.keys()}
+        )
+        self._published = fields
+        if not changes:
+            return
+        self.hass.bus.async_fire(
+            EVENT_DEVICE_UPDATE,
+            {
+                "device_id": self.id,
+                "name": self._name,
+                "timestamp": self._datapoint.get("timestamp"),
+                "changes": changes,
+            },
+        )
+
+    def restore(self, snapshot: dict[str, Any]) -> None:
+        """Restore the last known state saved by snapshot()."""
+        self._device_information = snapshot["device_information"]
+        self._datapoint = snapshot["datapoint"]
+        self._attribute = snapshot["attribute"]
+        self._last_success = snapshot["updated"]
+        self._stale = True
+        self._published = self._fields()
+        self._local_auto = snapshot.get("local_auto", False)
+        self._speed_count = snapshot.get("speed_count", DEFAULT_SPEED_COUNT)
+        self._percentages = self._build_percentages()
+        self._preset_modes = list(
+            snapshot.get("preset_modes", DEFAULT_PRESET_MODES)
+        )
+        self._learn_capabilities()
+        if "forecast" in snapshot:
+            self._forecast.restore(snapshot["forecast"])
+            self._filter_remaining_days = self._forecast.remaining_days()
+
+    def snapshot(self) -> dict[str, Any] | None:
+        """Return the last good state, or None before the first success."""
+        if self._last_success is None:
+            return None
+        return {
+            "device_information": self._device_information,
+            "datapoint": dict(self._datapoint),
+            "attribute": self._attribute,
+            "updated": self._last_success,
+            "forecast": self._forecast.as_dict(),
+            "local_auto": self._local_auto,
+            # Learned capabilities, the reported speed may be lower now
+            "speed_count": self._speed_count,
+            "preset_modes": list(self._preset_modes),
+        }
+
+    @property
+    def is_stale(self) -> bool:
+        """Return if the data is a snapshot that failed to revalidate."""
+        return self._stale
+
+    @property
+    def data_age(self) -> float | None:
+        """Return the seconds since the data was last refreshed."""
+        if self._last_success is None:
+            return None
+        return time.time() - self._last_success
+
+    async def _async_add_job(self, target, *args) -> Any:
+        """Run a blocking client call through the shared fleet."""
+        return await self.fleet.async_add_job(self._account, target, *args)
+
+    async def _async_call(self, method: str, *args) -> Any:
+        """Call a client method through the shared fleet."""
+        return await self._async_add_job(getattr(self.api_client, method), *args)
 
     @property
     def id(self) -> str:
@@ -142,6 +343,8 @@ class BlueairDataUpdateCoordinator(DataUpdateCoordinator):
     @property
     def fan_mode(self) -> str:
         """Return the current fan mode."""
+        if self._local_auto:
+            return LOCAL_AUTO_MODE
         if self._attribute["mode"] == "manual":
             return None
         return self._attribute["mode"]
@@ -186,37 +389,407 @@ class BlueairDataUpdateCoordinator(DataUpdateCoordinator):
         """Return the mac address."""
         return format_mac(self._device_information.get("mac", None))
 
-    async def set_fan_speed(self, new_speed) -> None:
-        """Set the fan speed to the specified value."""
-        await self.hass.async_add_executor_job(
-            lambda: self.api_client.set_fan_speed(self.id, new_speed)
+    @property
+    def filter_remaining_days(self) -> float | None:
+        """Return the forecast days until the filter needs replacing."""
+        return self._filter_remaining_days
+
+    @property
+    def has_sensors(self) -> bool:
+        """Return if the device reports air quality datapoints."""
+        if self.model == "foobot":
+            return False
+        return not (self.model.startswith("classic") and not self.model.endswith("i"))
+
+    @property
+    def analytics(self) -> dict[str, Any] | None:
+        """Return the analytics of the previous day, if computed."""
+        return self._analytics
+
+    def set_analytics(self, analytics: dict[str, Any] | None) -> None:
+        """Show new analytics in the sensors of the device."""
+        self._analytics = analytics
+        self.async_update_listeners()
+
+    @property
+    def history(self) -> DatapointHistory:
+        """Return the datapoints seen so far."""
+        return self._history
+
+    @property
+    def archive(self) -> TimeSeriesArchive:
+        """Return the long-term datapoint archive."""
+        return self._archive
+
+    async def async_close_archive(self) -> None:
+        """Stop archiving for good, once an open in progress finished.
+
+        The file can be removed afterwards, it is not mapped again.
+        """
+        self._archive_closed = True
+        self._archive_synced = False
+        if (opening := self._archive_opening) is not None:
+            with suppress(OSError):
+                await opening
+        self._archive.close()
+
+    @property
+    def account(self) -> str:
+        """Return the config entry the device belongs to."""
+        return self._account
+
+    @property
+    def speed_count(self) -> int:
+        """Return the number of speeds the fan supports, off excluded."""
+        return self._speed_count
+
+    @property
+    def percentage(self) -> int | None:
+        """Return the current fan speed as a percentage."""
+        speed = self.fan_speed
+        if speed is None:
+            return None
+        return self._percentages[min(speed, self._speed_count)]
+
+    @property
+    def preset_modes(self) -> list[str]:
+        """Return the preset modes the device supports."""
+        modes = self._preset_modes if self.fan_mode_supported else []
+        if self.has_sensors:
+            return [*modes, LOCAL_AUTO_MODE]
+        return modes
+
+    @property
+    def local_auto(self) -> bool:
+        """Return if the integration picks the fan speed."""
+        return self._local_auto
+
+    def speed_for_percentage(self, percentage: int) -> str:
+        """Return the fan speed to use for a percentage."""
+        if percentage == 0:
+            return "0"
+        return str(
+            math.ceil(percentage_to_ranged_value((1, self._speed_count), percentage))
+        )
+
+    def is_current(self, name: str, value: Any) -> bool:
+        """Return if an attribute already has the value a command would set.
+
+        Setting a speed also takes the fan out of auto or night mode, so a
+        speed is only current when the fan runs it in manual mode.
+        """
+        if name == "fan_speed" and self._attribute.get("mode", "manual") != "manual":
+            return False
+        return name in self._attribute and str(self._attribute[name]) == str(value)
+
+    async def set_fan_speed(
+        self, new_speed, refresh: bool = False, auto: bool = False
+    ) -> None:
+        """Set the fan speed to the specified value.
+
+        Nothing is sent if the fan already runs at that speed in manual mode,
+        otherwise the device switches to manual. The new speed is shown right
+        away and confirmed by the next poll, unless refresh asks for it now.
+        Local auto stops unless auto says it set the speed, in which case the
+        speed is always sent, as polls may still report an older one.
+        """
+        if not auto:
+            self.stop_local_auto()
+            if self.is_current("fan_speed", new_speed):
+                return
+        attributes = {**self._span_attributes(), "blueair.fan_speed": str(new_speed)}
+        with span(self.hass, "blueair.set_fan_speed", attributes):
+            await self._async_call("set_fan_speed", self.id, new_speed)
+        self.set_attribute("fan_speed", new_speed)
+        if refresh:
+            await self.async_refresh()
+
+    async def set_fan_mode(self, new_mode, refresh: bool = False) -> None:
+        """Set the fan mode to the specified value, see set_fan_speed."""
+        if new_mode == LOCAL_AUTO_MODE:
+            await self._async_start_local_auto()
+            return
+        self.stop_local_auto()
+        if self.is_current("mode", new_mode or "manual"):
+            return
+        attributes = {**self._span_attributes(), "blueair.mode": str(new_mode)}
+        with span(self.hass, "blueair.set_fan_mode", attributes):
+            await self._async_call("set_fan_mode", self.id, new_mode)
+        self.set_attribute("mode", new_mode or "manual")
+        if refresh:
+            await self.async_refresh()
+
+    async def _async_start_local_auto(self) -> None:
+        """Switch the device to manual and let the integration pick speeds."""
+        if self._local_auto:
+            return
+        if self.fan_mode_supported:
+            await self.set_fan_mode(None)
+        self._local_auto = True
+        self._local_auto_started = time.time()
+        self._controller = FanController()
+        self.async_update_listeners()
+        await self._async_control()
+
+    def stop_local_auto(self) -> None:
+        """Leave the fan speed to the user again."""
+        if self._local_auto:
+            self._local_auto = False
+            self.async_update_listeners()
+
+    def _schedule_control(self) -> None:
+        """Let local auto react to the data of a successful update."""
+        if self._local_auto:
+            self.hass.async_create_task(self._async_control())
+
+    async def _async_control(self) -> None:
+        """Set the speed local auto picks for the latest datapoint.
+
+        Local auto stops when the device was switched to another mode or
+        speed outside Home Assistant. Until its last command settled the
+        reported attributes may predate it, the speed it set is assumed.
+        """
+        if not self._local_auto or self._stale:
+            return
+        now = time.time()
+        controller = self._controller
+        commanded_at = max(self._local_auto_started, controller.changed_at or 0)
+        current = self.fan_speed
+        if now - commanded_at < COMMAND_SETTLE_SECONDS:
+            if controller.speed is not None:
+                current = controller.speed
+        elif self._attribute.get("mode", "manual") != "manual" or (
+            controller.speed is not None and current != controller.speed
+        ):
+            LOGGER.info("%s was changed, stopping local auto", self._name)
+            self.stop_local_auto()
+            return
+
+        speed = controller.next_speed(
+            current or 0, self._speed_count, self.pm25, self.voc, now
         )
-        self._attribute["fan_speed"] = new_speed
-        await self.async_refresh()
+        if speed is None:
+            return
+        # Failed commands count against the rate limit too
+        controller.record(speed, now)
+        try:
+            await self.set_fan_speed(str(speed), auto=True)
+        except Exception as error:
+            LOGGER.warning(
+                "Local auto couldn't set the speed of %s: %s", self._name, error
+            )
 
-    async def set_fan_mode(self, new_mode) -> None:
-        """Set the fan mode to the specified value."""
-        await self.hass.async_add_executor_job(
-            lambda: self.api_client.set_fan_mode(self.id, new_mode)
+    def async_update_listeners(self) -> None:
+        """Update all listeners, traced as the entity state writes."""
+        with span(self.hass, "blueair.write_state", self._span_attributes()):
+            super().async_update_listeners()
+
+    def _span_attributes(self) -> dict[str, Any]:
+        """Return the attributes identifying the device in trace spans."""
+        return {
+            "blueair.device_id": self.id,
+            "blueair.device_name": self._name,
+            "blueair.model": self.model,
+        }
+
+    def set_attribute(self, name: str, value: Any) -> None:
+        """Record an attribute that was set and update listeners optimistically."""
+        self._attribute[name] = str(value)
+        if name == "fan_speed" and "mode" in self._attribute:
+            # The device leaves auto and night mode when a speed is set
+            self._attribute["mode"] = "manual"
+        self._learn_capabilities()
+        self.async_update_listeners()
+
+    def _build_percentages(self) -> tuple[int, ...]:
+        """Return the percentage of every speed, built once per speed count."""
+        return (0,) + tuple(
+            ranged_value_to_percentage((1, self._speed_count), speed)
+            for speed in range(1, self._speed_count + 1)
         )
-        self._attribute["mode"] = new_mode
-        await self.async_refresh()
+
+    def _learn_capabilities(self) -> None:
+        """Extend speeds and presets to what the model or device reported."""
+        speed = MODEL_SPEED_COUNTS.get(self.model, DEFAULT_SPEED_COUNT)
+        with suppress(KeyError, TypeError, ValueError):
+            speed = max(speed, int(self._attribute["fan_speed"]))
+        if speed > self._speed_count:
+            self._speed_count = speed
+            self._percentages = self._build_percentages()
+        if self._attribute.get("mode") == NIGHT_MODE:
+            if NIGHT_MODE not in self._preset_modes:
+                self._preset_modes.append(NIGHT_MODE)
 
     async def _update_device(self, *_) -> None:
         """Update the device information from the API."""
         LOGGER.info(self._name)
-        self._device_information = await self.hass.async_add_executor_job(
-            lambda: self.api_client.get_info(self._uuid)
+        self._device_information = await self._async_add_job(
+            self.api_client.get_info, self._uuid
         )
         LOGGER.info(f"_device_information: {self._device_information}")
 
         with suppress(Exception):
             # Classics will not have the expected data here
-            self._datapoint = await self.hass.async_add_executor_job(
-                lambda: self.api_client.get_current_data_point(self._uuid)
-            )
+            if self._history.cursor is None:
+                rows = await self._async_call("get_latest_data_points", self._uuid)
+            else:
+                rows = await self._async_call(
+                    "get_data_points_after", self._uuid, self._history.cursor
+                )
+            self._extend_history(rows)
         LOGGER.info(f"_datapoint: {self._datapoint}")
-        self._attribute = await self.hass.async_add_executor_job(
-            lambda: self.api_client.get_attributes(self._uuid)
-        )
+        filter_status = self.filter_status
+        self._attribute = await self._async_call("get_attributes", self._uuid)
         LOGGER.info(f"_attribute: {self._attribute}")
+        self._learn_capabilities()
+        self._update_forecast(filter_status)
+
+    def _extend_history(self, rows: list[dict[str, Any]]) -> None:
+        """Add fetched datapoints to the history and the filter forecast."""
+        finalized = self._history.extend(rows, time.time())
+        self._datapoint = self._history.latest
+        if self._forecast.seeded:
+            # The samples were recorded at the speed seen by the last poll
+            self._forecast.extend(finalized, self._speed_fraction())
+        if self._archive_synced:
+            self._archive.add(finalized)
+
+    def _speed_fraction(self) -> float:
+        """Return the fan speed relative to the highest speed."""
+        return (self.fan_speed or 0) / self._speed_count
+
+    def _update_forecast(self, previous_filter_status: str | None) -> None:
+        """Track filter replacements and seed the filter forecast once."""
+        if (
+            previous_filter_status not in (None, "OK")
+            and self.filter_status == "OK"
+        ):
+            self._forecast.reset(int(time.time()))
+        self._schedule_catch_up()
+        self._filter_remaining_days = self._forecast.remaining_days()
+
+    def _schedule_catch_up(self) -> None:
+        """Catch up in the background unless it already is.
+
+        Catching up can take several fleet jobs, updates don't wait for it.
+        """
+        if self._catch_up_task is not None or (
+            self._archive_synced and self._forecast.seeded
+        ):
+            return
+        self._catch_up_task = self.hass.async_create_background_task(
+            self._async_catch_up(), f"{DOMAIN} {self._name} history catch-up"
+        )
+
+    async def _async_catch_up(self) -> None:
+        """Catch up and publish the forecast it may have seeded."""
+        try:
+            await self._catch_up()
+        finally:
+            self._catch_up_task = None
+        remaining_days = self._forecast.remaining_days()
+        if remaining_days != self._filter_remaining_days:
+            self._filter_remaining_days = remaining_days
+            self.async_update_listeners()
+
+    async def _catch_up(self) -> None:
+        """Fetch the datapoints the forecast and the archive are missing.
+
+        Both are filled from the same pages: the forecast from the seed
+        history, the archive from where it stopped, which after a restart
+        usually is a few minutes ago. Pages are fetched oldest first over as
+        many polls as needed and applied once all arrived. A failure keeps
+        the pages fetched so far and backs off before the next attempt.
+        Nothing is fetched for devices without datapoints or while the fleet
+        sheds load.
+        """
+        seed_forecast = not self._forecast.seeded
+        if (
+            (self._archive_synced and not seed_forecast)
+            or self._history.cursor is None
+            or self.fleet.shedding
+            or time.monotonic() < self._catch_up_retry_at
+            or self._archive_closed
+        ):
+            return
+        if not self._archive_synced and not self._archive.is_open:
+            self._archive_opening = self.hass.async_add_executor_job(
+                self._archive.open
+            )
+            try:
+                await self._archive_opening
+            except OSError as error:
+                LOGGER.warning("Can't open the archive of %s: %s", self._name, error)
+                # Carry on without archiving until the entry is reloaded
+                self._archive_synced = True
+                if not seed_forecast:
+                    return
+            finally:
+                self._archive_opening = None
+            if self._archive_closed:
+                # The device was removed while the file was being opened
+                self._archive.close()
+                return
+
+        now = int(time.time())
+        if self._catch_up_position is None:
+            seconds = SEED_SECONDS
+            if not seed_forecast and self._archive.last is not None:
+                seconds = max(
+                    DEFAULT_SAMPLE_PERIOD,
+                    min(SEED_SECONDS, now - self._archive.last),
+                )
+            # Pages start on sample boundaries, so no sample is cut in two
+            self._catch_up_position = (
+                (now - seconds) // DEFAULT_SAMPLE_PERIOD * DEFAULT_SAMPLE_PERIOD
+            )
+        for _ in range(CATCH_UP_PAGES):
+            if self._catch_up_position >= now or self._archive_closed:
+                break
+            end = min(self._catch_up_position + CATCH_UP_PAGE, now)
+            try:
+                rows = await self._async_add_job(
+                    self._fetch_history, self._catch_up_position, end
+                )
+            except Exception as error:
+                LOGGER.debug(
+                    "No datapoint history for %s, retrying in %ss: %s",
+                    self._name,
+                    self._catch_up_delay,
+                    error,
+                )
+                self._catch_up_retry_at = time.monotonic() + self._catch_up_delay
+                self._catch_up_delay = min(
+                    self._catch_up_delay * 2, CATCH_UP_MAX_RETRY
+                )
+                return
+            self._catch_up_rows.extend(rows)
+            self._catch_up_position = end
+        if self._catch_up_position < now:
+            return
+
+        rows = self._catch_up_rows
+        self._catch_up_position = None
+        self._catch_up_rows = []
+        self._catch_up_delay = CATCH_UP_RETRY
+        if seed_forecast:
+            # Older speeds aren't known, the seed assumes the current one,
+            # which the wear rate reflects until polls outweigh the seed
+            self._forecast.extend(rows, self._speed_fraction())
+        if self._archive.is_open:
+            self._archive.add(rows)
+            self._archive.add(self._history.rows)
+            self._archive_synced = True
+
+    def _fetch_history(self, start: int, end: int) -> list[dict[str, Any]]:
+        """Fetch the datapoints between two timestamps, blocking."""
+        return list(self.api_client.iter_data_points_between(self._uuid, start, end))
+
+
+def _apply_changes(target: dict[str, Any], changes: dict[str, Any]) -> None:
+    """Apply changes sent by a worker, where None removes a key."""
+    for key, value in changes.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
@@ -0,0 +1,36 @@
+"""Diagnostics support for blueair."""
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, FLEET
+from .device import BlueairDataUpdateCoordinator
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    fleet = hass.data[DOMAIN][FLEET]
+    devices: list[BlueairDataUpdateCoordinator] = hass.data[DOMAIN][
+        entry.entry_id
+    ]["devices"]
+    return {
+        "cost": fleet.account_cost(entry.entry_id),
+        "executor": fleet.executor_stats(),
+        "jitter": fleet.jitter(),
+        "shedding": fleet.shedding_state(),
+        "transport": fleet.transport_metrics(),
+        "dns": fleet.dns.snapshot(),
+        "payload_per_poll": fleet.payload_per_poll(),
+        "devices": [
+            {
+                "model": device.model,
+                "last_update_success": device.last_update_success,
+                "phase": round(fleet.phase(device.id), 1),
+            }
+            for device in devices
+        ],
+    }
@@ -1,9 +1,11 @@
 """Base entity class for Blueair entities."""
 
+from typing import Any
+
 from homeassistant.helpers.device_registry import CONNECTION_NETWORK_MAC
 from homeassistant.helpers.entity import DeviceInfo, Entity
 
-from .const import DOMAIN
+from .const import ATTR_DATA_AGE, DOMAIN
 from .device import BlueairDataUpdateCoordinator
 
 
@@ -39,6 +41,13 @@ class BlueairEntity(Entity):
             connections={(CONNECTION_NETWORK_MAC, self._device.mac_address)},
         )
 
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return how old the data is while serving the last known state."""
+        if not self._device.is_stale:
+            return None
+        return {ATTR_DATA_AGE: round(self._device.data_age)}
+
     async def async_update(self):
         """Update Blueair entity."""
         await self._device.async_request_refresh()
@@ -0,0 +1,240 @@
+"""Export of raw Blueair datapoint history to compressed files."""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import gzip
+import importlib
+import json
+import os
+import threading
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+from . import blueair
+from .const import LOGGER
+from .device import BlueairDataUpdateCoordinator
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+
+# History is requested one window at a time. Fetching a window is a single
+# fleet job, writing it and the checkpoint happens outside the job timeout.
+EXPORT_WINDOW = 86400
+# Rows written per CSV batch or Parquet row group
+CHUNK_SIZE = 1000
+# How long an export waits before checking again whether load shedding ended
+SHEDDING_PAUSE = 60
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+class ExportCheckpoint:
+    """Per-device position an export can resume from.
+
+    Next to the timestamp to resume from, the size of the device's CSV file
+    at that point is kept, so rows written after the last checkpoint are cut
+    off again before resuming instead of being written twice. Devices are
+    exported concurrently, so writes are serialized and the file is replaced
+    atomically.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """Load the checkpoint from the export directory."""
+        self._path = os.path.join(directory, CHECKPOINT_FILE)
+        self._lock = threading.Lock()
+        try:
+            with open(self._path, encoding="utf-8") as file:
+                self._positions: dict[str, list[int]] = json.load(file)
+        except FileNotFoundError:
+            self._positions = {}
+
+    def get(self, device_uuid: str) -> tuple[int, int] | None:
+        """Return the timestamp to resume a device from and its file size."""
+        if (saved := self._positions.get(device_uuid)) is None:
+            return None
+        position, size = saved
+        return position, size
+
+    def set(self, device_uuid: str, position: int, size: int = 0) -> None:
+        """Record the timestamp to resume a device from and its file size."""
+        with self._lock:
+            self._positions[device_uuid] = [position, size]
+            temp_path = f"{self._path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._positions, file)
+            os.replace(temp_path, self._path)
+
+
+def _write_csv(path: str, size: int, chunks) -> tuple[int | None, int]:
+    """Append column chunks to a gzipped CSV file of the given size.
+
+    Anything past size was written after the last checkpoint and is cut off
+    first. Every append is a gzip member of its own, so the file stays valid.
+    Return the last timestamp written and the new size of the file.
+    """
+    last = None
+    with open(path, "ab") as raw:
+        raw.truncate(size)
+        write_header = size == 0
+        with gzip.open(raw, "at", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            for columns in chunks:
+                keys = list(columns)
+                if write_header:
+                    writer.writerow(keys)
+                    write_header = False
+                writer.writerows(zip(*columns.values()))
+                last = columns["timestamp"][-1]
+        return last, raw.tell()
+
+
+def _write_parquet(path: str, chunks) -> int | None:
+    """Write column chunks as row groups of a Parquet file."""
+    # pyarrow is large and only needed for this format, so it is optional
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+    last = None
+    writer = None
+    temp_path = f"{path}.tmp"
+    try:
+        for columns in chunks:
+            table = pa.table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(temp_path, table.schema, compression="zstd")
+            writer.write_table(table)
+            last = columns["timestamp"][-1]
+    finally:
+        if writer is not None:
+            writer.close()
+    # A window written again after an interruption replaces the earlier file
+    if writer is not None:
+        os.replace(temp_path, path)
+    return last
+
+
+def fetch_window(
+    client: blueair.BlueAir, device_uuid: str, start: int, end: int
+) -> list[dict[str, list]]:
+    """Fetch one window of history as column chunks."""
+    return list(
+        client.iter_data_point_columns_between(
+            device_uuid, start, end, chunk_size=CHUNK_SIZE
+        )
+    )
+
+
+def write_window(
+    device_uuid: str,
+    start: int,
+    end: int,
+    chunks: list[dict[str, list]],
+    directory: str,
+    file_format: str,
+    checkpoint: ExportCheckpoint,
+) -> int:
+    """Write one fetched window and checkpoint it, return where the next starts.
+
+    The next window starts right after the last row written rather than at
+    the end of this one, so a sample that was still partial at the end of
+    the window is picked up again by the next request.
+    """
+    size = 0
+    if file_format == FORMAT_PARQUET:
+        device_directory = os.path.join(directory, device_uuid)
+        os.makedirs(device_directory, exist_ok=True)
+        last = _write_parquet(
+            os.path.join(device_directory, f"{start}.parquet"), chunks
+        )
+    else:
+        saved = checkpoint.get(device_uuid)
+        last, size = _write_csv(
+            os.path.join(directory, f"{device_uuid}.csv.gz"),
+            0 if saved is None else saved[1],
+            chunks,
+        )
+
+    position = end if last is None else last + 1
+    checkpoint.set(device_uuid, position, size)
+    return position
+
+
+async def async_validate_format(hass: HomeAssistant, file_format: str) -> None:
+    """Raise if the libraries needed for an export format are missing."""
+    if file_format != FORMAT_PARQUET:
+        return
+    try:
+        await hass.async_add_executor_job(importlib.import_module, "pyarrow.parquet")
+    except ImportError as error:
+        raise HomeAssistantError("Parquet export requires pyarrow") from error
+
+
+async def async_export_history(
+    hass: HomeAssistant,
+    devices: list[BlueairDataUpdateCoordinator],
+    start: int,
+    end: int,
+    directory: str,
+    file_format: str,
+) -> None:
+    """Export the history of several devices concurrently.
+
+    Every range gets a subdirectory of its own, named after its start and
+    end, so exports of different ranges never share files or checkpoints.
+    This runs as a background task, failures are logged per device and the
+    checkpoint lets a later call with the same directory and range resume.
+    Every device is exported by a task of its config entry, so unloading the
+    entry stops it.
+    """
+    directory = os.path.join(directory, f"{start}-{end}")
+    await hass.async_add_executor_job(os.makedirs, directory, 0o755, True)
+    checkpoint = await hass.async_add_executor_job(ExportCheckpoint, directory)
+
+    async def async_export_device(device: BlueairDataUpdateCoordinator) -> None:
+        saved = checkpoint.get(device.id)
+        position = start if saved is None else max(start, saved[0])
+        while position < end:
+            if device.fleet.shedding:
+                await asyncio.sleep(SHEDDING_PAUSE)
+                continue
+            window_end = min(position + EXPORT_WINDOW, end)
+            chunks = await device.fleet.async_add_job(
+                device.account,
+                fetch_window,
+                device.api_client,
+                device.id,
+                position,
+                window_end,
+            )
+            position = await hass.async_add_executor_job(
+                write_window,
+                device.id,
+                position,
+                window_end,
+                chunks,
+                directory,
+                file_format,
+                checkpoint,
+            )
+        LOGGER.info("Exported BlueAir history of %s to %s", device.id, directory)
+
+    tasks = []
+    for device in devices:
+        entry = hass.config_entries.async_get_entry(device.account)
+        tasks.append(
+            entry.async_create_background_task(
+                hass,
+                async_export_device(device),
+                f"BlueAir history export of {device.id}",
+            )
+        )
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for device, result in zip(devices, results):
+        if isinstance(result, asyncio.CancelledError):
+            LOGGER.info("BlueAir history export of %s stopped", device.id)
+        elif isinstance(result, Exception):
+            LOGGER.error("BlueAir history export of %s failed: %s", device.id, result)
+
@@ -3,27 +3,35 @@
 from typing import Any
 
 from homeassistant.components.fan import FanEntity, FanEntityFeature
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
-from .const import DOMAIN
+from .const import DOMAIN, SIGNAL_ADD_DEVICES
 from .device import BlueairDataUpdateCoordinator
 from .entity import BlueairEntity
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
     """Set up the Blueair fans from config entry."""
-    devices: list[BlueairDataUpdateCoordinator] = hass.data[DOMAIN][
-        config_entry.entry_id
-    ]["devices"]
-    entities = []
-    for device in devices:
-        if device.model != "foobot":
-            entities.extend(
-                [
-                    BlueairFan(f"{device.device_name}_fan", device),
-                ]
-            )
-    async_add_entities(entities)
+
+    @callback
+    def async_add_devices(devices: list[BlueairDataUpdateCoordinator]) -> None:
+        entities = []
+        for device in devices:
+            if device.model != "foobot":
+                entities.extend(
+                    [
+                        BlueairFan(f"{device.device_name}_fan", device),
+                    ]
+                )
+        async_add_entities(entities)
+
+    async_add_devices(hass.data[DOMAIN][config_entry.entry_id]["devices"])
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, f"{SIGNAL_ADD_DEVICES}_{config_entry.entry_id}", async_add_devices
+        )
+    )
 
 
 class BlueairFan(BlueairEntity, FanEntity):
@@ -37,8 +45,8 @@ class BlueairFan(BlueairEntity, FanEntity):
     @property
     def supported_features(self) -> int:
         """Return the supported features of the fan."""
-        # If the fan_mode property is supported, enable support for presets
-        if self._device.fan_mode_supported:
+        # Presets are supported with fan modes or local auto
+        if self._device.preset_modes:
             return FanEntityFeature.SET_SPEED | FanEntityFeature.PRESET_MODE
         return FanEntityFeature.SET_SPEED
 
@@ -50,36 +58,23 @@ class BlueairFan(BlueairEntity, FanEntity):
     @property
     def percentage(self) -> int | None:
         """Return the current speed percentage."""
-        if self._device.fan_speed is not None:
-            return int(round(self._device.fan_speed * 33.33, 0))
-        return 0
+        return self._device.percentage or 0
 
     @property
     def preset_mode(self) -> str | None:
         """Return the current preset mode."""
-        if self._device.fan_mode_supported:
+        if self._device.local_auto or self._device.fan_mode_supported:
             return self._device.fan_mode
         return None
 
     @property
     def preset_modes(self) -> list | None:
         """Return the list of available preset modes."""
-        if self._device.fan_mode_supported:
-            return ["auto"]
-        return None
+        return self._device.preset_modes or None
 
     async def async_set_percentage(self, percentage: int) -> None:
         """Set fan speed percentage."""
-        if percentage == 100:
-            new_speed = "3"
-        elif percentage > 50:
-            new_speed = "2"
-        elif percentage > 20:
-            new_speed = "1"
-        else:
-            new_speed = "0"
-
-        await self._device.set_fan_speed(new_speed)
+        await self._device.set_fan_speed(self._device.speed_for_percentage(percentage))
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn off the fan."""
@@ -96,4 +91,4 @@ class BlueairFan(BlueairEntity, FanEntity):
     @property
     def speed_count(self) -> int:
         """Return the number of speeds the fan supports."""
-        return 3
+        return self._device.speed_count
@@ -0,0 +1,518 @@
+"""Domain-wide client pool shared by every BlueAir config entry."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from contextvars import copy_context
+from datetime import timedelta
+from functools import partial
+import hashlib
+import math
+import time
+from typing import Any
+
+import requests
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+
+from .blueair import (
+    DnsCache,
+    DnsCachingAdapter,
+    MetricsMiddleware,
+    ReplayMiddleware,
+    Transport,
+)
+from .const import DOMAIN, FLEET, LOGGER, MIDDLEWARE, SIGNAL_SHEDDING
+from .tracing import span
+
+POLL_INTERVAL = timedelta(seconds=60)
+POOL_SIZE = 10
+# Also the number of threads of the executor owned by the fleet, so BlueAir
+# never takes more threads than this away from the rest of Home Assistant
+MAX_CONCURRENT_JOBS = 4
+MAX_JOBS_PER_SECOND = 10
+# Applied once a job holds a slot, so time spent queueing behind other
+# devices doesn't count against it
+JOB_TIMEOUT = 10
+
+# Connections opened ahead of the first poll. Each is a fleet job, so they
+# wait for free slots like any other job instead of adding threads.
+WARM_CONNECTIONS = MAX_CONCURRENT_JOBS - 1
+
+# Devices whose phases are closer than this are polled by the same timer
+_GROUP_WINDOW = 0.5
+
+# How often the event loop lag is measured
+LAG_PROBE_INTERVAL = 5.0
+# Event loop lag in seconds and queued jobs at which each shedding level
+# starts. Level 1 doubles the poll interval and pauses history, analytics
+# and discovery work, level 2 quadruples the poll interval.
+SHED_LAG = (0.1, 0.5)
+SHED_QUEUED = (2 * MAX_CONCURRENT_JOBS, 4 * MAX_CONCURRENT_JOBS)
+# Weight of the newest lag measurement in the moving average
+_LAG_SMOOTHING = 0.3
+
+
+def _phase(uuid: str, interval: float) -> float:
+    """Return a phase within the interval that is stable for a device.
+
+    Hashing the uuid spreads any number of devices evenly over the interval
+    without having to know in advance how many there will be, and gives a
+    device the same phase after every restart.
+    """
+    digest = hashlib.sha256(uuid.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 * interval
+
+
+def _job_name(target: Callable[..., Any]) -> str:
+    """Return the name of a job's function, without partial arguments.
+
+    The arguments of a partial can hold credentials, so its repr is never
+    used.
+    """
+    while isinstance(target, partial):
+        target = target.func
+    return getattr(target, "__qualname__", type(target).__name__)
+
+
+def _next_phase(uuid: str, after: float, interval: float) -> float:
+    """Return the first wall clock time after a time at the device's phase."""
+    phase = _phase(uuid, interval)
+    return phase + (math.floor((after - phase) / interval) + 1) * interval
+
+
+class AccountCost:
+    """Executor work accumulated on behalf of one account."""
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+        self.jobs: int = 0
+        self.errors: int = 0
+        self.busy_seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters as a dictionary."""
+        return {
+            "jobs": self.jobs,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+class JitterStats:
+    """Lateness of polls compared to the times they were scheduled for."""
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+        self.polls: int = 0
+        self.total_seconds: float = 0.0
+        self.max_seconds: float = 0.0
+
+    def add(self, lateness: float) -> None:
+        """Record the lateness of a poll."""
+        self.polls += 1
+        self.total_seconds += abs(lateness)
+        self.max_seconds = max(self.max_seconds, abs(lateness))
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters as a dictionary."""
+        return {
+            "polls": self.polls,
+            "mean_ms": round(self.total_seconds / self.polls * 1000, 1)
+            if self.polls
+            else None,
+            "max_ms": round(self.max_seconds * 1000, 1),
+        }
+
+
+class LoadShedder:
+    """Turns event loop lag and executor queue depth into a shedding level.
+
+    The lag is a moving average, so a single slow callback doesn't trigger
+    shedding, and the level drops by at most one per measurement so polling
+    recovers gradually once the host has caught up.
+    """
+
+    def __init__(self) -> None:
+        """Initialize at no shedding."""
+        self.level: int = 0
+        self.lag: float = 0.0
+
+    def update(self, lag: float, queued: int) -> bool:
+        """Add a lag measurement, return True if the level changed."""
+        self.lag += _LAG_SMOOTHING * (max(lag, 0.0) - self.lag)
+        target = max(
+            sum(self.lag >= threshold for threshold in SHED_LAG),
+            sum(queued >= threshold for threshold in SHED_QUEUED),
+        )
+        level = target if target > self.level else max(target, self.level - 1)
+        changed = level != self.level
+        self.level = level
+        return changed
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the state as a dictionary."""
+        return {"level": self.level, "loop_lag_ms": round(self.lag * 1000, 1)}
+
+
+class PollSchedule:
+    """When each device of an account is due for its next poll.
+
+    Devices are due at their phase of every interval. Devices due within
+    _GROUP_WINDOW of the first one are polled together, and each of them is
+    then due one interval after its own due time, so a device polled a bit
+    early with its group isn't due again right away.
+    """
+
+    def __init__(self, interval: float) -> None:
+        """Initialize a schedule without devices."""
+        self.interval = interval
+        self._due: dict[str, float] = {}
+
+    def next_group(self, uuids: list[str], now: float) -> tuple[float, list[str]]:
+        """Return when the next group is due and the devices in it.
+
+        Devices seen for the first time are due at their next phase, devices
+        that are gone are forgotten.
+        """
+        self._due = {
+            uuid: self._due.get(uuid) or _next_phase(uuid, now, self.interval)
+            for uuid in uuids
+        }
+        if not self._due:
+            return now + self.interval, []
+        at = min(self._due.values())
+        return at, [uuid for uuid, due in self._due.items() if due - at < _GROUP_WINDOW]
+
+    def advance(self, group: list[str], now: float) -> None:
+        """Make the devices of a polled group due one interval later."""
+        for uuid in group:
+            if (due := self._due.get(uuid)) is None:
+                continue
+            due += self.interval
+            # After the event loop stalled, resume at the next phase rather
+            # than polling the missed intervals back to back
+            if due <= now:
+                due = _next_phase(uuid, now, self.interval)
+            self._due[uuid] = due
+
+
+class QueueStats:
+    """Queueing of jobs waiting for a slot of the fleet executor.
+
+    Stranded jobs are threads still running for a caller that gave up on
+    them after a timeout or cancellation. They keep their slot until they
+    finish, so they are the backlog that delays the next jobs.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+        self.queued: int = 0
+        self.peak_queued: int = 0
+        self.running: int = 0
+        self.wait_seconds: float = 0.0
+        self.max_wait_seconds: float = 0.0
+        self.cancelled: int = 0
+        self.stranded: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters as a dictionary."""
+        return {
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "running": self.running,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "cancelled": self.cancelled,
+            "stranded": self.stranded,
+        }
+
+
+class BlueairFleet:
+    """Shares one connection pool, executor, rate limiter and poll scheduler.
+
+    Every config entry registers itself as an account. Blocking client calls
+    go through async_add_job, which runs them on a small executor owned by
+    the fleet instead of the one shared by all of Home Assistant, bounds how
+    many of them may be in flight and how fast new ones are started. A job
+    counts as in flight until its thread is done, even if its caller gave
+    up on it.
+    Every device is polled at its own phase of the poll interval, aligned
+    to the wall clock, so requests are spread evenly instead of landing at
+    the same time.
+    """
+
+    def __init__(self, hass: HomeAssistant, middleware: list | None = None) -> None:
+        """Initialize the fleet."""
+        self.hass = hass
+        self.session = requests.Session()
+        self.dns = DnsCache()
+        adapter = DnsCachingAdapter(
+            self.dns, pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.transport = Transport(self.session, middleware or [])
+        self._executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="blueair"
+        )
+        self._queue = QueueStats()
+        self._jobs: dict[str, set[asyncio.Future]] = {}
+        self._stranded: set[Future] = set()
+
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+        self._min_spacing: float = 1 / MAX_JOBS_PER_SECOND
+        self._next_start: float = 0.0
+        self._costs: dict[str, AccountCost] = {}
+        self._accounts: set[str] = set()
+        self._timers: dict[str, CALLBACK_TYPE] = {}
+        self._jitter = JitterStats()
+        self._device_polls: int = 0
+        self._shedder = LoadShedder()
+        self._probe = hass.loop.call_later(
+            LAG_PROBE_INTERVAL,
+            self._async_probe_lag,
+            hass.loop.time() + LAG_PROBE_INTERVAL,
+        )
+
+    async def async_add_job(
+        self, account: str, target: Callable[..., Any], *args: Any
+    ) -> Any:
+        """Run a blocking client call for an account in the fleet executor."""
+        cost = self._costs.setdefault(account, AccountCost())
+        queue = self._queue
+        queued = time.monotonic()
+        queue.queued += 1
+        queue.peak_queued = max(queue.peak_queued, queue.queued)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            queue.queued -= 1
+        future: Future | None = None
+        try:
+            await self._async_throttle()
+            start = time.monotonic()
+            queue.wait_seconds += start - queued
+            queue.max_wait_seconds = max(queue.max_wait_seconds, start - queued)
+            attributes = {
+                "blueair.account": account,
+                "blueair.job": _job_name(target),
+                "blueair.queue_seconds": start - queued,
+            }
+            with span(self.hass, "blueair.job", attributes):
+                # The copied context carries the current span into the thread
+                future = self._executor.submit(copy_context().run, target, *args)
+                queue.running += 1
+                # The slot is only released once the thread is done, a job
+                # that timed out keeps holding it while it still runs
+                future.add_done_callback(self._release)
+                job = asyncio.wrap_future(future)
+                jobs = self._jobs.setdefault(account, set())
+                jobs.add(job)
+                try:
+                    async with asyncio.timeout(JOB_TIMEOUT):
+                        return await job
+                except asyncio.CancelledError:
+                    queue.cancelled += 1
+                    raise
+                except Exception:
+                    cost.errors += 1
+                    raise
+                finally:
+                    jobs.discard(job)
+                    if not future.done():
+                        self._stranded.add(future)
+                        queue.stranded += 1
+                    cost.jobs += 1
+                    cost.busy_seconds += time.monotonic() - start
+        finally:
+            if future is None:
+                self._semaphore.release()
+
+    def _release(self, future: Future) -> None:
+        """Hand the slot of a finished job back, called from its thread."""
+        with suppress(RuntimeError):
+            # The loop is already closed when a job outlives Home Assistant
+            self.hass.loop.call_soon_threadsafe(self._async_release, future)
+
+    @callback
+    def _async_release(self, future: Future) -> None:
+        """Release the slot of a job whose thread is done."""
+        self._queue.running -= 1
+        if future in self._stranded:
+            self._stranded.discard(future)
+            self._queue.stranded -= 1
+        self._semaphore.release()
+
+    async def _async_throttle(self) -> None:
+        """Space job starts out to at most MAX_JOBS_PER_SECOND."""
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self._min_spacing
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @callback
+    def _async_probe_lag(self, expected: float) -> None:
+        """Measure how late the loop ran this callback and update shedding."""
+        now = self.hass.loop.time()
+        if self._shedder.update(now - expected, self._queue.queued):
+            LOGGER.info(
+                "BlueAir load shedding level %s, event loop lag %.0f ms",
+                self._shedder.level,
+                self._shedder.lag * 1000,
+            )
+            async_dispatcher_send(self.hass, SIGNAL_SHEDDING)
+        self._probe = self.hass.loop.call_at(
+            now + LAG_PROBE_INTERVAL,
+            self._async_probe_lag,
+            now + LAG_PROBE_INTERVAL,
+        )
+
+    @property
+    def shedding(self) -> int:
+        """Return the current shedding level, 0 when not shedding."""
+        return self._shedder.level
+
+    def shedding_state(self) -> dict[str, Any]:
+        """Return the shedding level and the loop lag it is based on."""
+        return {**self._shedder.as_dict(), "queued": self._queue.queued}
+
+    @callback
+    def async_add_account(
+        self, account: str, coordinators: list, poll: bool = True
+    ) -> None:
+        """Start polling the coordinators of an account at their phases.
+
+        The list is read every time the next poll is scheduled, so
+        coordinators added to it later are picked up without re-registering
+        the account. Accounts polled elsewhere, by a worker process, only
+        share the rest of the fleet.
+        """
+        self._accounts.add(account)
+        self._costs.setdefault(account, AccountCost())
+        if not poll:
+            return
+        interval = POLL_INTERVAL.total_seconds()
+        schedule = PollSchedule(interval)
+
+        @callback
+        def _async_schedule() -> None:
+            at, group = schedule.next_group(
+                [coordinator.id for coordinator in coordinators], time.time()
+            )
+            self._timers[account] = async_call_later(
+                self.hass, max(at - time.time(), 0), partial(_async_poll, at, group)
+            )
+
+        @callback
+        def _async_poll(scheduled: float, group: list[str], _now: Any) -> None:
+            self._jitter.add(time.time() - scheduled)
+            # Shedding stretches the interval by dropping polls, not delaying
+            # them, so devices keep their phases
+            if int(scheduled // interval) % 2**self._shedder.level == 0:
+                polled = [c for c in coordinators if c.id in group]
+                self._device_polls += len(polled)
+                for coordinator in polled:
+                    self.hass.async_create_task(coordinator.async_refresh())
+            schedule.advance(group, time.time())
+            _async_schedule()
+
+        _async_schedule()
+
+    @callback
+    def async_remove_account(self, account: str) -> bool:
+        """Stop polling an account, return True if no accounts are left.
+
+        Callers waiting for the account's running jobs are cancelled. The
+        executor threads can't be interrupted, they finish in the background
+        and keep their slots until then, counted as stranded.
+        """
+        if (unsub := self._timers.pop(account, None)) is not None:
+            unsub()
+        for job in self._jobs.pop(account, set()):
+            job.cancel()
+        self._costs.pop(account, None)
+        self._accounts.discard(account)
+        return not self._accounts
+
+    @staticmethod
+    def phase(uuid: str) -> float:
+        """Return the offset of a device's polls from the start of the interval."""
+        return _phase(uuid, POLL_INTERVAL.total_seconds())
+
+    def jitter(self) -> dict[str, Any]:
+        """Return how late polls started compared to their phase."""
+        return self._jitter.as_dict()
+
+    def account_cost(self, account: str) -> dict[str, Any]:
+        """Return the executor cost accumulated by an account."""
+        return self._costs.get(account, AccountCost()).as_dict()
+
+    def executor_stats(self) -> dict[str, Any]:
+        """Return the queueing statistics of the fleet executor."""
+        return self._queue.as_dict()
+
+    def transport_metrics(self) -> dict[str, Any]:
+        """Return the request metrics of the shared transport."""
+        for middleware in self.transport.middleware:
+            if isinstance(middleware, MetricsMiddleware):
+                return middleware.snapshot()
+        return {}
+
+    def payload_per_poll(self) -> dict[str, Any]:
+        """Return the bytes received per device poll, compressed and decoded.
+
+        All traffic counts, so commands and history requests add to it.
+        """
+        metrics = self.transport_metrics().values()
+        if not self._device_polls:
+            return {}
+        return {
+            key: round(sum(host[key] for host in metrics) / self._device_polls)
+            for key in ("bytes", "decoded_bytes")
+        }
+
+    async def async_warm_up(self, account: str, url: str) -> None:
+        """Open connections to a URL in parallel ahead of the first poll.
+
+        Every connection is opened by a job of the account, bounded and
+        throttled like the account's other jobs. Failures only mean the first
+        poll opens the connection itself. Nothing is opened when requests are
+        replayed from a fixture or while the fleet sheds load.
+        """
+        if self.shedding or any(
+            isinstance(m, ReplayMiddleware) for m in self.transport.middleware
+        ):
+            return
+        await asyncio.gather(
+            *[
+                self.async_add_job(account, self.transport.warm_up, url)
+                for _ in range(WARM_CONNECTIONS)
+            ],
+            return_exceptions=True,
+        )
+
+    async def async_shutdown(self) -> None:
+        """Cancel outstanding jobs and release the executor and connections."""
+        self._probe.cancel()
+        for jobs in self._jobs.values():
+            for job in jobs:
+                job.cancel()
+        # Jobs already running can't be interrupted, they finish on their own
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        await self.hass.async_add_executor_job(self.session.close)
+
+
+@callback
+def async_get_fleet(hass: HomeAssistant) -> BlueairFleet:
+    """Return the fleet, creating it for the first config entry."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if FLEET not in domain_data:
+        domain_data[FLEET] = BlueairFleet(hass, domain_data.get(MIDDLEWARE))
+    return domain_data[FLEET]
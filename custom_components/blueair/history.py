@@ -0,0 +1,67 @@
+"""In-memory datapoint history for Blueair devices."""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from .blueair.blueair import DEFAULT_SAMPLE_PERIOD
+
+# One day of samples at the server's default sample period
+HISTORY_LENGTH = 288
+
+
+class DatapointHistory:
+    """Ring buffer of finalized datapoints plus the sample still being collected.
+
+    The cursor is the timestamp of the newest finalized datapoint, so each
+    poll only has to ask the server for datapoints after it. The newest
+    sample is kept aside until its sample period has ended, which means a
+    sample is never stored with partial values and never parsed into the
+    buffer twice.
+    """
+
+    def __init__(self, maxlen: int = HISTORY_LENGTH) -> None:
+        """Initialize the history."""
+        self.rows: deque[Mapping[str, Any]] = deque(maxlen=maxlen)
+        self.pending: Mapping[str, Any] | None = None
+
+    @property
+    def cursor(self) -> int | None:
+        """Return the timestamp to fetch newer datapoints after."""
+        if self.rows:
+            return self.rows[-1]["timestamp"]
+        if self.pending is not None:
+            return self.pending["timestamp"] - 1
+        return None
+
+    @property
+    def latest(self) -> Mapping[str, Any]:
+        """Return the most recent datapoint, final or not."""
+        if self.pending is not None:
+            return self.pending
+        if self.rows:
+            return self.rows[-1]
+        return {}
+
+    def extend(
+        self, rows: Iterable[Mapping[str, Any]], now: float
+    ) -> list[Mapping[str, Any]]:
+        """Add fetched datapoints and return the ones that became final."""
+        cursor = self.rows[-1]["timestamp"] if self.rows else None
+        candidates = [] if self.pending is None else [self.pending]
+        for row in rows:
+            if cursor is not None and row["timestamp"] <= cursor:
+                continue
+            if candidates and row["timestamp"] <= candidates[-1]["timestamp"]:
+                # A fresher copy of the pending sample replaces the old one
+                candidates.pop()
+            candidates.append(row)
+
+        self.pending = None
+        if candidates and candidates[-1]["timestamp"] + DEFAULT_SAMPLE_PERIOD > now:
+            self.pending = candidates.pop()
+
+        self.rows.extend(candidates)
+        return candidates
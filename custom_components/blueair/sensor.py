@@ -11,12 +11,16 @@ from homeassistant.const import (
     CONCENTRATION_PARTS_PER_MILLION,
     PERCENTAGE,
     UnitOfTemperature,
+    UnitOfTime,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import EntityCategory
 
-from .const import DOMAIN
+from .const import DOMAIN, FLEET, SIGNAL_ADD_DEVICES, SIGNAL_SHEDDING
 from .device import BlueairDataUpdateCoordinator
 from .entity import BlueairEntity
+from .fleet import BlueairFleet
 
 NAME_TEMPERATURE = "Temperature"
 NAME_HUMIDITY = "Humidity"
@@ -24,34 +28,54 @@ NAME_HUMIDITY = "Humidity"
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
     """Set up the Blueair sensors from config entry."""
-    devices: list[BlueairDataUpdateCoordinator] = hass.data[DOMAIN][
-        config_entry.entry_id
-    ]["devices"]
-    entities = []
-    for device in devices:
-        # Don't add sensors to classic models
-        if (
-            device.model.startswith("classic") and not device.model.endswith("i")
-        ) or device.model == "foobot":
-            pass
-        else:
-            entities.extend(
-                [
-                    BlueairTemperatureSensor(
-                        f"{device.device_name}_temperature", device
-                    ),
-                    BlueairHumiditySensor(f"{device.device_name}_humidity", device),
-                    BlueairCO2Sensor(f"{device.device_name}_co2", device),
-                    BlueairVOCSensor(f"{device.device_name}_voc", device),
-                    BlueairAllPollutionSensor(
-                        f"{device.device_name}_all_pollution", device
-                    ),
-                    BlueairPM1Sensor(f"{device.device_name}_pm1", device),
-                    BlueairPM10Sensor(f"{device.device_name}_pm10", device),
-                    BlueairPM25Sensor(f"{device.device_name}_pm25", device),
-                ]
-            )
-    async_add_entities(entities)
+
+    @callback
+    def async_add_devices(devices: list[BlueairDataUpdateCoordinator]) -> None:
+        entities = []
+        for device in devices:
+            # Don't add sensors to classic models
+            if device.has_sensors:
+                entities.extend(
+                    [
+                        BlueairTemperatureSensor(
+                            f"{device.device_name}_temperature", device
+                        ),
+                        BlueairHumiditySensor(
+                            f"{device.device_name}_humidity", device
+                        ),
+                        BlueairCO2Sensor(f"{device.device_name}_co2", device),
+                        BlueairVOCSensor(f"{device.device_name}_voc", device),
+                        BlueairAllPollutionSensor(
+                            f"{device.device_name}_all_pollution", device
+                        ),
+                        BlueairPM1Sensor(f"{device.device_name}_pm1", device),
+                        BlueairPM10Sensor(f"{device.device_name}_pm10", device),
+                        BlueairPM25Sensor(f"{device.device_name}_pm25", device),
+                        BlueairFilterLifeSensor(
+                            f"{device.device_name}_filter_life", device
+                        ),
+                        BlueairEffectivenessSensor(
+                            f"{device.device_name}_effectiveness", device
+                        ),
+                        BlueairDecayRateSensor(
+                            f"{device.device_name}_decay_rate", device
+                        ),
+                        BlueairRoomRankSensor(
+                            f"{device.device_name}_room_rank", device
+                        ),
+                    ]
+                )
+        async_add_entities(entities)
+
+    async_add_entities(
+        [BlueairSheddingSensor(config_entry.entry_id, hass.data[DOMAIN][FLEET])]
+    )
+    async_add_devices(hass.data[DOMAIN][config_entry.entry_id]["devices"])
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, f"{SIGNAL_ADD_DEVICES}_{config_entry.entry_id}", async_add_devices
+        )
+    )
 
 
 class BlueairTemperatureSensor(BlueairEntity, SensorEntity):
@@ -236,3 +260,111 @@ class BlueairPM25Sensor(BlueairEntity, SensorEntity):
         if self._device.pm25 is None:
             return None
         return round(self._device.pm25, 0)
+
+
+class BlueairFilterLifeSensor(BlueairEntity, SensorEntity):
+    """Forecasts the days until the filter needs replacing."""
+
+    entity_description = SensorEntityDescription(
+        key="filter_life",
+        name="Filter life",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.DAYS,
+        icon="mdi:air-filter",
+    )
+
+    def __init__(self, name, device) -> None:
+        """Initialize the filter life sensor."""
+        super().__init__("filter_life", name, device)
+        self._state: float = None
+
+    @property
+    def native_value(self) -> float:
+        """Return the forecast days of filter life left."""
+        if self._device.filter_remaining_days is None:
+            return None
+        return round(self._device.filter_remaining_days, 0)
+
+
+class BlueairAnalyticsSensor(BlueairEntity, SensorEntity):
+    """Shows one value of the analytics of the previous day."""
+
+    def __init__(self, name, device) -> None:
+        """Initialize the analytics sensor."""
+        super().__init__(self.entity_description.key, name, device)
+        self._state: float = None
+
+    @property
+    def native_value(self) -> float:
+        """Return the value of the previous day."""
+        if self._device.analytics is None:
+            return None
+        return self._device.analytics[self.entity_description.key]
+
+
+class BlueairEffectivenessSensor(BlueairAnalyticsSensor):
+    """Monitors the share of the previous day with clean air."""
+
+    entity_description = SensorEntityDescription(
+        key="effectiveness",
+        name="Clean air effectiveness",
+        native_unit_of_measurement=PERCENTAGE,
+        icon="mdi:air-purifier",
+    )
+
+
+class BlueairDecayRateSensor(BlueairAnalyticsSensor):
+    """Monitors how fast pm25 fell after pollution events the previous day."""
+
+    entity_description = SensorEntityDescription(
+        key="decay_rate",
+        name="PM2.5 decay rate",
+        native_unit_of_measurement="1/h",
+        icon="mdi:chart-bell-curve-cumulative",
+    )
+
+
+class BlueairRoomRankSensor(BlueairAnalyticsSensor):
+    """Ranks the room of the device by mean pm25 of the previous day."""
+
+    entity_description = SensorEntityDescription(
+        key="room_rank",
+        name="Room rank",
+        icon="mdi:podium",
+    )
+
+
+class BlueairSheddingSensor(SensorEntity):
+    """Shows how far polling is cut back to relieve an overloaded host."""
+
+    entity_description = SensorEntityDescription(
+        key="shedding_level",
+        name="BlueAir load shedding level",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        icon="mdi:speedometer-slow",
+    )
+    _attr_should_poll = False
+
+    def __init__(self, entry_id: str, fleet: BlueairFleet) -> None:
+        """Initialize the load shedding sensor."""
+        self._attr_name = "BlueAir load shedding level"
+        self._attr_unique_id = f"{entry_id}_shedding_level"
+        self._fleet = fleet
+
+    async def async_added_to_hass(self) -> None:
+        """Update when the shedding level changes."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_SHEDDING, self.async_write_ha_state
+            )
+        )
+
+    @property
+    def native_value(self) -> int:
+        """Return the shedding level, 0 when not shedding."""
+        return self._fleet.shedding
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Return the event loop lag and queue depth behind the level."""
+        return self._fleet.shedding_state()
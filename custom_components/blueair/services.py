@@ -0,0 +1,267 @@
+"""Services for the blueair integration."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import (
+    config_validation as cv,
+    device_registry as dr,
+    entity_registry as er,
+)
+from homeassistant.util import dt as dt_util
+
+from .const import ANALYTICS, DOMAIN, LOGGER
+from .device import BlueairDataUpdateCoordinator
+from .export import (
+    FORMAT_CSV,
+    FORMAT_PARQUET,
+    async_export_history,
+    async_validate_format,
+)
+
+SERVICE_EXPORT_HISTORY = "export_history"
+SERVICE_GET_ANALYTICS = "get_analytics"
+SERVICE_SET_FLEET = "set_fleet"
+
+ATTR_DIRECTORY = "directory"
+ATTR_END = "end"
+ATTR_FORMAT = "format"
+ATTR_PERCENTAGE = "percentage"
+ATTR_PRESET_MODE = "preset_mode"
+ATTR_START = "start"
+
+DEFAULT_EXPORT_DIRECTORY = "blueair_export"
+
+# Commands handed to the client per executor job. The client sends a batch
+# one command after the other, so a job stays well inside the fleet job
+# timeout; batches run in parallel as separate fleet jobs.
+BATCH_SIZE = 4
+
+SET_FLEET_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+            vol.Optional(ATTR_PERCENTAGE): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=100)
+            ),
+            vol.Optional(ATTR_PRESET_MODE): vol.In(["auto", "manual"]),
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_PERCENTAGE, ATTR_PRESET_MODE),
+)
+
+GET_ANALYTICS_SCHEMA = vol.Schema({vol.Optional(ATTR_ENTITY_ID): cv.entity_ids})
+
+EXPORT_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Required(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_FORMAT, default=FORMAT_CSV): vol.In(
+            [FORMAT_CSV, FORMAT_PARQUET]
+        ),
+        vol.Optional(ATTR_DIRECTORY): cv.string,
+    }
+)
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the blueair services once for all config entries."""
+    if hass.services.has_service(DOMAIN, SERVICE_SET_FLEET):
+        return
+
+    async def async_set_fleet(call: ServiceCall) -> None:
+        """Set fan speed and/or preset mode on many devices at once."""
+        devices = [
+            device
+            for device in async_resolve_devices(hass, call.data.get(ATTR_ENTITY_ID))
+            if device.model != "foobot"
+        ]
+        if not devices:
+            return
+
+        failed = 0
+        if ATTR_PRESET_MODE in call.data:
+            mode = call.data[ATTR_PRESET_MODE]
+            failed += await _async_send([(device, "mode", mode) for device in devices])
+        if ATTR_PERCENTAGE in call.data:
+            percentage = call.data[ATTR_PERCENTAGE]
+            failed += await _async_send(
+                [
+                    (device, "fan_speed", device.speed_for_percentage(percentage))
+                    for device in devices
+                ],
+            )
+
+        # Devices show the new state optimistically, the next poll confirms it
+        if failed:
+            raise HomeAssistantError(f"{failed} BlueAir commands failed")
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_FLEET, async_set_fleet, schema=SET_FLEET_SCHEMA
+    )
+
+    async def async_export(call: ServiceCall) -> None:
+        """Start exporting datapoint history in the background."""
+        devices = async_resolve_devices(hass, call.data.get(ATTR_ENTITY_ID))
+        directory = call.data.get(
+            ATTR_DIRECTORY, hass.config.path(DEFAULT_EXPORT_DIRECTORY)
+        )
+        if not hass.config.is_allowed_path(directory):
+            raise HomeAssistantError(f"{directory} is not an allowed path")
+        await async_validate_format(hass, call.data[ATTR_FORMAT])
+
+        start = int(dt_util.as_timestamp(call.data[ATTR_START]))
+        end = int(dt_util.as_timestamp(call.data.get(ATTR_END, dt_util.utcnow())))
+        hass.async_create_task(
+            async_export_history(
+                hass, devices, start, end, directory, call.data[ATTR_FORMAT]
+            )
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_EXPORT_HISTORY, async_export, schema=EXPORT_HISTORY_SCHEMA
+    )
+
+    async def async_get_analytics(call: ServiceCall) -> ServiceResponse:
+        """Return the analytics of the previous day.
+
+        Rooms are ranked within the config entry of their devices.
+        """
+        accounts: dict[str, list[BlueairDataUpdateCoordinator]] = {}
+        for device in async_resolve_devices(hass, call.data.get(ATTR_ENTITY_ID)):
+            accounts.setdefault(device.account, []).append(device)
+
+        response: dict[str, Any] = {"devices": {}, "rooms": []}
+        for account, devices in accounts.items():
+            result = await hass.data[DOMAIN][account][ANALYTICS].async_get()
+            response["start"] = dt_util.utc_from_timestamp(
+                result["start"]
+            ).isoformat()
+            response["rooms"].extend(result["rooms"])
+            for device in devices:
+                if device.id in result["devices"]:
+                    response["devices"][device.device_name] = result["devices"][
+                        device.id
+                    ]
+        return response
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_ANALYTICS,
+        async_get_analytics,
+        schema=GET_ANALYTICS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+@callback
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the blueair services."""
+    hass.services.async_remove(DOMAIN, SERVICE_SET_FLEET)
+    hass.services.async_remove(DOMAIN, SERVICE_EXPORT_HISTORY)
+    hass.services.async_remove(DOMAIN, SERVICE_GET_ANALYTICS)
+
+
+@callback
+def _async_all_devices(hass: HomeAssistant) -> list[BlueairDataUpdateCoordinator]:
+    """Return the devices of every loaded config entry."""
+    return [
+        device
+        for entry in hass.config_entries.async_entries(DOMAIN)
+        for device in hass.data[DOMAIN].get(entry.entry_id, {}).get("devices", [])
+    ]
+
+
+@callback
+def async_resolve_devices(
+    hass: HomeAssistant, entity_ids: list[str] | None
+) -> list[BlueairDataUpdateCoordinator]:
+    """Map entity ids to their devices, or return every device."""
+    devices = _async_all_devices(hass)
+    if entity_ids is None:
+        return devices
+
+    by_id = {device.id: device for device in devices}
+    entity_registry = er.async_get(hass)
+    device_registry = dr.async_get(hass)
+    resolved: dict[str, BlueairDataUpdateCoordinator] = {}
+    for entity_id in entity_ids:
+        entity = entity_registry.async_get(entity_id)
+        if entity is None or entity.platform != DOMAIN or entity.device_id is None:
+            raise HomeAssistantError(f"{entity_id} is not a BlueAir entity")
+        registry_device = device_registry.async_get(entity.device_id)
+        for domain, identifier in registry_device.identifiers:
+            if domain == DOMAIN and identifier in by_id:
+                resolved[identifier] = by_id[identifier]
+    return list(resolved.values())
+
+
+async def _async_send(
+    commands: list[tuple[BlueairDataUpdateCoordinator, str, Any]],
+) -> int:
+    """Send commands concurrently, return how many failed.
+
+    Commands that would not change anything are skipped, the rest are
+    grouped per account and sent through the client batch API.
+    """
+    jobs = []
+    batches: dict[str, list[tuple[BlueairDataUpdateCoordinator, str, Any]]] = {}
+    for command in commands:
+        device, attribute, value = command
+        # Commanded devices are no longer left to local auto
+        device.stop_local_auto()
+        if device.is_current(attribute, value):
+            continue
+        batches.setdefault(device.account, []).append(command)
+
+    for account_commands in batches.values():
+        for start in range(0, len(account_commands), BATCH_SIZE):
+            batch = account_commands[start : start + BATCH_SIZE]
+            jobs.append(_async_send_batch(batch))
+
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+
+    failed = 0
+    for result in results:
+        if isinstance(result, int):
+            failed += result
+        elif isinstance(result, Exception):
+            LOGGER.warning("BlueAir command failed: %s", result)
+            failed += 1
+    return failed
+
+
+async def _async_send_batch(
+    commands: list[tuple[BlueairDataUpdateCoordinator, str, Any]],
+) -> int:
+    """Send one batch of cloud commands for an account."""
+    first = commands[0][0]
+    errors = await first.fleet.async_add_job(
+        first.account,
+        first.api_client.set_attributes,
+        [(device.id, attribute, value) for device, attribute, value in commands],
+    )
+
+    failed = 0
+    for (device, attribute, value), error in zip(commands, errors):
+        if error is None:
+            device.set_attribute(attribute, value)
+        else:
+            LOGGER.warning("BlueAir command for %s failed: %s", device.id, error)
+            failed += 1
+    return failed
@@ -0,0 +1,78 @@
+"""Persisted last known state of Blueair devices."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .device import BlueairDataUpdateCoordinator
+
+STORAGE_VERSION = 1
+# Devices refresh every minute, their data only changes every five. Saves
+# happen at most this long after the first unsaved update.
+SAVE_DELAY = 300
+
+
+class SnapshotStore:
+    """Saves the last good data of every device of a config entry.
+
+    Devices are restored from it on startup so entities have values before
+    the first poll, and keep serving it when a poll fails.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry_id: str,
+        devices: list[BlueairDataUpdateCoordinator],
+    ) -> None:
+        """Initialize the store for the devices of a config entry."""
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self._devices = devices
+        self._data: dict[str, Any] = {}
+        self._save_scheduled: bool = False
+
+    async def async_load(self) -> None:
+        """Load the saved snapshots."""
+        self._data = await self._store.async_load() or {}
+
+    @callback
+    def async_restore(self, device: BlueairDataUpdateCoordinator) -> bool:
+        """Restore a device from its snapshot, return False if there is none."""
+        if device.id not in self._data:
+            return False
+        device.restore(self._data[device.id])
+        return True
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Save the snapshots of all devices after a delay.
+
+        Updates arriving while a save is pending don't push it back, so
+        polls more frequent than the delay still get their data saved.
+        """
+        if self._save_scheduled:
+            return
+        self._save_scheduled = True
+        self._store.async_delay_save(self._snapshots, SAVE_DELAY)
+
+    async def async_save(self) -> None:
+        """Save the snapshots of all devices now."""
+        await self._store.async_save(self._snapshots())
+
+    @callback
+    def _snapshots(self) -> dict[str, Any]:
+        """Return the snapshots to save."""
+        self._save_scheduled = False
+        for device in self._devices:
+            snapshot = device.snapshot()
+            if snapshot is not None:
+                self._data[device.id] = snapshot
+        return self._data
+
+    async def async_remove(self) -> None:
+        """Delete the saved snapshots."""
+        await self._store.async_remove()
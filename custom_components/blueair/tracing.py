@@ -0,0 +1,62 @@
+"""Optional OpenTelemetry tracing of the blueair integration."""
+
+from __future__ import annotations
+
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, LOGGER, TRACER
+
+CONF_FILE = "file"
+CONF_OTLP_ENDPOINT = "otlp_endpoint"
+
+
+def build_tracer_provider(conf: dict[str, Any]) -> Any | None:
+    """Return a tracer provider exporting to the configured target.
+
+    Spans go to an OTLP/HTTP collector or, one JSON object per line, to a
+    file. Returns None when the OpenTelemetry packages are missing.
+    """
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import (
+            BatchSpanProcessor,
+            ConsoleSpanExporter,
+        )
+
+        if CONF_OTLP_ENDPOINT in conf:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+
+            exporter = OTLPSpanExporter(endpoint=conf[CONF_OTLP_ENDPOINT])
+        else:
+            exporter = ConsoleSpanExporter(
+                out=open(conf[CONF_FILE], "a", encoding="utf-8"),
+                formatter=lambda span: span.to_json(indent=None) + "\n",
+            )
+    except ImportError as error:
+        LOGGER.warning("BlueAir tracing requires OpenTelemetry: %s", error)
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": DOMAIN}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    return provider
+
+
+def span(
+    hass: HomeAssistant, name: str, attributes: dict[str, Any] | None = None
+) -> AbstractContextManager:
+    """Return a context manager tracing a span, or doing nothing if disabled.
+
+    Spans started in the event loop are the parents of the HTTP spans of the
+    executor jobs they wait for, as the fleet runs jobs in a copy of the
+    caller's context.
+    """
+    tracer = hass.data.get(DOMAIN, {}).get(TRACER)
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes)
@@ -0,0 +1,211 @@
+"""Websocket API serving datapoint history from memory."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+import time
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+
+from .archive import AGGREGATES, TIERS
+from .blueair.blueair import DEFAULT_SAMPLE_PERIOD
+from .const import DOMAIN, HISTORY_CACHE
+from .device import BlueairDataUpdateCoordinator
+from .services import async_resolve_devices
+
+# History older than the in-memory datapoints of a device is fetched and
+# cached one UTC day at a time
+CACHE_WINDOW = 86400
+# Datapoints kept for all devices together, about a month of one device
+MAX_CACHED_ROWS = 10000
+# Longest range of datapoints served in one request, every day of it not in
+# memory is a cloud call
+MAX_HISTORY_SPAN = 31 * 86400
+
+
+class HistoryCache:
+    """Size-capped cache of datapoint windows fetched from the cloud.
+
+    Concurrent requests for a window that isn't cached yet share a single
+    cloud call. Windows that aren't over yet are returned but not cached.
+    The least recently used windows are evicted first.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty cache."""
+        self._windows: OrderedDict[tuple[str, int], list[Mapping[str, Any]]] = (
+            OrderedDict()
+        )
+        self._rows = 0
+        self._pending: dict[tuple[str, int], asyncio.Future] = {}
+
+    async def async_get(
+        self, device: BlueairDataUpdateCoordinator, start: int, end: int
+    ) -> list[Mapping[str, Any]]:
+        """Return the datapoints of a device between two timestamps."""
+        rows: list[Mapping[str, Any]] = []
+        history = device.history.rows
+        # The coordinator keeps the most recent datapoints warm
+        oldest = history[0]["timestamp"] if history else None
+        if oldest is None or start < oldest:
+            first = start // CACHE_WINDOW * CACHE_WINDOW
+            last = end if oldest is None else min(end, oldest)
+            windows = await asyncio.gather(
+                *[
+                    self._async_window(device, window)
+                    for window in range(first, last, CACHE_WINDOW)
+                ]
+            )
+            for window in windows:
+                rows.extend(window)
+        if oldest is not None:
+            rows.extend(history)
+            if device.history.pending is not None:
+                rows.append(device.history.pending)
+
+        seen: set[int] = set()
+        result = []
+        for row in rows:
+            timestamp = row["timestamp"]
+            if start <= timestamp <= end and timestamp not in seen:
+                seen.add(timestamp)
+                result.append(row)
+        result.sort(key=lambda row: row["timestamp"])
+        return result
+
+    async def _async_window(
+        self, device: BlueairDataUpdateCoordinator, start: int
+    ) -> list[Mapping[str, Any]]:
+        """Return one window from the cache, fetching it if needed."""
+        key = (device.id, start)
+        if key in self._windows:
+            self._windows.move_to_end(key)
+            return self._windows[key]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            rows = await device.fleet.async_add_job(
+                device.account,
+                device.api_client.get_data_points_between,
+                device.id,
+                start,
+                start + CACHE_WINDOW,
+            )
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Waiters see the error, don't warn about it being unretrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(rows)
+        finally:
+            del self._pending[key]
+
+        if start + CACHE_WINDOW + DEFAULT_SAMPLE_PERIOD <= time.time():
+            self._add(key, rows)
+        return rows
+
+    def _add(self, key: tuple[str, int], rows: list[Mapping[str, Any]]) -> None:
+        """Cache a window, evicting the least recently used ones."""
+        self._windows[key] = rows
+        self._rows += len(rows)
+        while self._rows > MAX_CACHED_ROWS and len(self._windows) > 1:
+            _, evicted = self._windows.popitem(last=False)
+            self._rows -= len(evicted)
+
+
+def _columns(
+    rows: list[Mapping[str, Any]], keys: Iterable[str] | None
+) -> dict[str, list[Any]]:
+    """Return rows as one array per key, missing values as None."""
+    if keys is None:
+        keys = list(dict.fromkeys(key for row in rows for key in row))
+    keys = ["timestamp", *[key for key in keys if key != "timestamp"]]
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+@callback
+def async_register_websocket_commands(hass: HomeAssistant) -> None:
+    """Register the websocket commands of the integration."""
+    hass.data.setdefault(DOMAIN, {})[HISTORY_CACHE] = HistoryCache()
+    websocket_api.async_register_command(hass, ws_history)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "blueair/history",
+        vol.Required("entity_id"): cv.entity_id,
+        vol.Required("start"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional("end"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional("keys"): [cv.string],
+        vol.Optional("resolution"): vol.In([name for name, _, _ in TIERS]),
+    }
+)
+@websocket_api.async_response
+async def ws_history(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Return the datapoints of a device as columns.
+
+    Start and end are Unix timestamps. The result maps timestamp and every
+    requested measurement to an array with one value per datapoint. With a
+    resolution, the aggregates of that archive tier are returned instead,
+    as <key>_min, <key>_mean and <key>_max arrays. Without one, the range
+    can't be longer than MAX_HISTORY_SPAN.
+    """
+    end = msg.get("end", int(time.time()))
+    if msg["start"] > end:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_INVALID_FORMAT, "start is after end"
+        )
+        return
+    if "resolution" not in msg and end - msg["start"] > MAX_HISTORY_SPAN:
+        connection.send_error(
+            msg["id"],
+            websocket_api.ERR_INVALID_FORMAT,
+            f"Ranges longer than {MAX_HISTORY_SPAN // 86400} days need a resolution",
+        )
+        return
+    try:
+        devices = async_resolve_devices(hass, [msg["entity_id"]])
+    except HomeAssistantError as error:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, str(error))
+        return
+    if not devices:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, "Device not found"
+        )
+        return
+
+    if "resolution" in msg:
+        keys = msg.get("keys")
+        if keys is not None:
+            keys = [f"{key}_{aggregate}" for key in keys for aggregate in AGGREGATES]
+        rows = devices[0].archive.rows(msg["resolution"], msg["start"], end)
+        connection.send_result(msg["id"], _columns(rows, keys))
+        return
+
+    try:
+        rows = await hass.data[DOMAIN][HISTORY_CACHE].async_get(
+            devices[0], msg["start"], end
+        )
+    except Exception as error:
+        connection.send_error(msg["id"], websocket_api.ERR_UNKNOWN_ERROR, str(error))
+        return
+    connection.send_result(msg["id"], _columns(rows, msg.get("keys")))
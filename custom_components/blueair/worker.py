@@ -0,0 +1,173 @@
+"""Supervision of the process polling the devices of a config entry."""
+
+from __future__ import annotations
+
+from contextlib import suppress
+import multiprocessing
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .blueair import worker
+from .const import LOGGER
+from .device import BlueairDataUpdateCoordinator
+from .fleet import POLL_INTERVAL
+
+# Delay before restarting a worker that exited, doubled after every crash
+RESTART_DELAY = 5
+MAX_RESTART_DELAY = 300
+# A worker that ran this long resets the restart delay
+STABLE_SECONDS = 600
+STOP_TIMEOUT = 5
+
+
+class BlueairWorker:
+    """Runs the polling of a config entry in a separate process.
+
+    The worker fetches and parses everything and sends back only what
+    changed, which the devices apply in the event loop. A worker that
+    exits for any reason is restarted after a growing delay, picking up
+    from the datapoint cursors of the devices, while the devices keep
+    serving their last known state. Commands don't go through the worker,
+    and neither does catching up on missing history: the devices fetch it
+    in the background through the fleet, as they do without a worker.
+
+    The worker is spawned rather than forked, as forking a process running
+    threads isn't safe, so it imports this package again on startup.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        username: str,
+        password: str,
+        client: Any,
+        devices: list[BlueairDataUpdateCoordinator],
+    ) -> None:
+        """Initialize the worker of a config entry."""
+        self.hass = hass
+        self._username = username
+        self._password = password
+        self._client = client
+        self._devices = devices
+        self._context = multiprocessing.get_context("spawn")
+        self._process: Any = None
+        self._conn: Any = None
+        self._started: float = 0.0
+        self._restart_delay: float = RESTART_DELAY
+        self._cancel_restart: Any = None
+        self._stopping = False
+        self.restarts: int = 0
+
+    def _cursors(self) -> dict[str, int | None]:
+        """Return where the worker should continue fetching datapoints."""
+        return {device.id: device.history.cursor for device in self._devices}
+
+    async def async_start(self) -> None:
+        """Start the worker process and listen to it."""
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=worker.run,
+            args=(
+                child_conn,
+                self._username,
+                self._password,
+                self._client.home_host,
+                self._client.auth_token,
+                self._cursors(),
+                POLL_INTERVAL.total_seconds(),
+            ),
+            name="blueair-worker",
+            daemon=True,
+        )
+        # Spawning blocks until the child has been created
+        await self.hass.async_add_executor_job(process.start)
+        child_conn.close()
+        self._process = process
+        self._conn = parent_conn
+        self._started = time.monotonic()
+        self.hass.loop.add_reader(parent_conn.fileno(), self._async_read)
+        self.hass.loop.add_reader(process.sentinel, self._async_exited)
+        LOGGER.debug("Started BlueAir worker %s", process.pid)
+
+    @callback
+    def async_set_devices(self) -> None:
+        """Tell the worker the device list changed."""
+        if self._conn is not None:
+            with suppress(OSError):
+                self._conn.send_bytes(worker.encode(("devices", self._cursors())))
+
+    @callback
+    def _async_read(self) -> None:
+        """Apply the messages the worker sent."""
+        by_id = {device.id: device for device in self._devices}
+        try:
+            while self._conn.poll():
+                message = worker.decode(self._conn.recv_bytes())
+                device = by_id.get(message[1])
+                if device is None:
+                    continue
+                if message[0] == "update":
+                    _, _, info, attributes, keys, rows = message
+                    self.hass.async_create_task(
+                        device.async_apply_update(
+                            info, attributes, [dict(zip(keys, row)) for row in rows]
+                        )
+                    )
+                elif message[0] == "error":
+                    device.serve_stale(message[2])
+        except (EOFError, OSError):
+            # The process is gone, _async_exited takes care of it
+            self.hass.loop.remove_reader(self._conn.fileno())
+
+    @callback
+    def _async_exited(self) -> None:
+        """Clean up after the worker process exited and restart it."""
+        self._detach()
+        if self._stopping:
+            return
+        if time.monotonic() - self._started >= STABLE_SECONDS:
+            self._restart_delay = RESTART_DELAY
+        LOGGER.warning(
+            "BlueAir worker exited with code %s, restarting in %ss",
+            self._process.exitcode,
+            self._restart_delay,
+        )
+        self.restarts += 1
+
+        async def _async_restart(*_) -> None:
+            self._cancel_restart = None
+            await self.async_start()
+
+        self._cancel_restart = async_call_later(
+            self.hass, self._restart_delay, _async_restart
+        )
+        self._restart_delay = min(self._restart_delay * 2, MAX_RESTART_DELAY)
+
+    @callback
+    def _detach(self) -> None:
+        """Stop listening to the current process."""
+        if self._conn is not None:
+            self.hass.loop.remove_reader(self._conn.fileno())
+            self._conn.close()
+            self._conn = None
+        if self._process is not None:
+            self.hass.loop.remove_reader(self._process.sentinel)
+
+    async def async_stop(self) -> None:
+        """Stop the worker process."""
+        self._stopping = True
+        if self._cancel_restart is not None:
+            self._cancel_restart()
+        if self._process is None:
+            return
+        process = self._process
+        if self._conn is not None:
+            with suppress(OSError):
+                self._conn.send_bytes(worker.encode(("stop",)))
+        self._detach()
+        await self.hass.async_add_executor_job(process.join, STOP_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
@@ -0,0 +1,143 @@
+"""Tests for the daily air quality analytics."""
+
+import math
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.blueair.analytics import (
+    ANALYTICS_WINDOW,
+    BlueairAnalytics,
+    _correlations,
+    _decay_rate,
+    compute,
+)
+from custom_components.blueair.blueair.blueair import DEFAULT_SAMPLE_PERIOD
+from custom_components.blueair.fleet import BlueairFleet
+
+PERIOD = DEFAULT_SAMPLE_PERIOD
+
+
+def _timestamps(count: int, start: int = 0) -> list[int]:
+    return [start + n * PERIOD for n in range(count)]
+
+
+def test_compute_means_effectiveness_and_rooms() -> None:
+    """Devices are summarised and their rooms ranked by mean PM2.5."""
+    series = {
+        "clean": (_timestamps(4), [5.0, 10.0, 15.0, 30.0]),
+        "dirty": (_timestamps(2), [40.0, 60.0]),
+        "silent": ([], []),
+    }
+    rooms = {"clean": "Bedroom", "dirty": "Kitchen", "silent": "Hall"}
+
+    result = compute(np, 0, series, rooms)
+
+    clean = result["devices"]["clean"]
+    assert clean["samples"] == 4
+    assert clean["mean_pm25"] == 15.0
+    assert clean["effectiveness"] == 75.0
+    assert clean["room_rank"] == 1
+    assert result["devices"]["dirty"]["room_rank"] == 2
+    assert result["devices"]["silent"]["mean_pm25"] is None
+    assert result["devices"]["silent"]["room_rank"] is None
+    assert [room["room"] for room in result["rooms"]] == ["Bedroom", "Kitchen"]
+
+
+def test_compute_ignores_samples_outside_the_day() -> None:
+    """Only samples of the day are laid out on the grid."""
+    series = {"uuid": ([-PERIOD, 0, ANALYTICS_WINDOW], [99.0, 5.0, 99.0])}
+
+    result = compute(np, 0, series, {"uuid": "Bedroom"})
+
+    assert result["devices"]["uuid"]["samples"] == 1
+    assert result["devices"]["uuid"]["mean_pm25"] == 5.0
+
+
+def test_decay_rate_of_an_exponential_decay() -> None:
+    """The rate is the decay constant per hour after a pollution event."""
+    rate = 0.6
+    timestamps = _timestamps(8)
+    values = [80.0 * math.exp(-rate * t / 3600) for t in timestamps]
+
+    assert _decay_rate(np, timestamps, values) == round(rate, 3)
+
+
+def test_decay_rate_needs_an_event() -> None:
+    """Falling levels that never reached EVENT_PM25 are no decay."""
+    assert _decay_rate(np, _timestamps(3), [20.0, 15.0, 10.0]) is None
+    assert _decay_rate(np, _timestamps(1), [80.0]) is None
+    # A gap between samples breaks the run
+    assert _decay_rate(np, [0, 10 * PERIOD], [80.0, 40.0]) is None
+
+
+def test_correlations_with_the_fleet_median() -> None:
+    """Devices tracking the median correlate, single devices don't."""
+    grid = np.array(
+        [
+            [1.0, 2.0, 3.0, 4.0, np.nan],
+            [2.0, 4.0, 6.0, 8.0, 10.0],
+            [9.0, 7.0, 5.0, 3.0, np.nan],
+            [1.0, np.nan, np.nan, np.nan, np.nan],
+        ]
+    )
+    observed = ~np.isnan(grid)
+
+    correlations = _correlations(np, grid, observed)
+
+    # The median of each column is 1.5, 4, 5, 4 and 10
+    assert correlations[0] == pytest.approx(0.735, abs=0.001)
+    assert correlations[1] == pytest.approx(0.859, abs=0.001)
+    assert correlations[2] == pytest.approx(-0.735, abs=0.001)
+    # Too few samples to correlate
+    assert np.isnan(correlations[3])
+    assert np.isnan(_correlations(np, grid[:1], observed[:1])).all()
+
+
+def _device(hass: HomeAssistant, fleet: BlueairFleet, uuid: str):
+    archive = MagicMock()
+    archive.covers.return_value = False
+    return SimpleNamespace(
+        id=uuid,
+        account="account",
+        has_sensors=True,
+        archive=archive,
+        fleet=fleet,
+        api_client=MagicMock(),
+        room_location=None,
+        device_name=uuid,
+        set_analytics=MagicMock(),
+    )
+
+
+async def test_failed_devices_are_retried(hass: HomeAssistant) -> None:
+    """A device that failed to fetch is fetched again, the others aren't."""
+    fleet = BlueairFleet(hass)
+    good = _device(hass, fleet, "good")
+    bad = _device(hass, fleet, "bad")
+    rows = [{"timestamp": 0, "pm25": 5.0}]
+    good.api_client.get_data_points_between.return_value = rows
+    bad.api_client.get_data_points_between.side_effect = OSError("unreachable")
+    analytics = BlueairAnalytics(hass, [good, bad])
+    now = dt_util.utc_from_timestamp(ANALYTICS_WINDOW + 600)
+
+    result = await analytics.async_get(now)
+    assert list(result["devices"]) == ["good"]
+    bad.set_analytics.assert_called_with(None)
+
+    bad.api_client.get_data_points_between.side_effect = None
+    bad.api_client.get_data_points_between.return_value = rows
+    result = await analytics.async_get(now)
+    assert set(result["devices"]) == {"good", "bad"}
+    assert good.api_client.get_data_points_between.call_count == 1
+    assert bad.set_analytics.call_args.args[0]["samples"] == 1
+
+    # Complete days are served from the cache
+    assert await analytics.async_get(now) is result
+    assert bad.api_client.get_data_points_between.call_count == 2
+    await fleet.async_shutdown()
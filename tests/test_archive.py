@@ -0,0 +1,77 @@
+"""Tests for the blueair datapoint archive."""
+
+from custom_components.blueair.archive import FILE_SIZE, TIERS, TimeSeriesArchive
+
+DAY = 86400
+
+
+def _archive(tmp_path) -> TimeSeriesArchive:
+    archive = TimeSeriesArchive(str(tmp_path / "device.rrd"))
+    archive.open()
+    return archive
+
+
+def test_rows_aggregate_datapoints_per_slot(tmp_path) -> None:
+    """A slot holds the minimum, mean and maximum of its datapoints."""
+    archive = _archive(tmp_path)
+    rows = [
+        {"timestamp": DAY, "pm25": 1.0},
+        {"timestamp": DAY + 300, "pm25": 2.0},
+        {"timestamp": DAY + 600, "pm25": 6.0},
+    ]
+    assert archive.add(rows) == 3
+
+    rows = archive.rows("hour", 0, 2 * DAY)
+    assert rows == [
+        {"timestamp": DAY, "pm25_min": 1.0, "pm25_mean": 3.0, "pm25_max": 6.0}
+    ]
+    archive.close()
+
+
+def test_older_datapoints_are_ignored(tmp_path) -> None:
+    """Overlapping fetches don't count a datapoint twice."""
+    archive = _archive(tmp_path)
+    archive.add([{"timestamp": DAY, "pm25": 1.0}])
+    assert archive.add([{"timestamp": DAY, "pm25": 1.0}]) == 0
+    assert archive.rows("5min", DAY, DAY)[0]["pm25_mean"] == 1.0
+    archive.close()
+
+
+def test_rows_are_bounded_by_the_archive(tmp_path) -> None:
+    """Huge ranges only cost the slots the tier holds."""
+    archive = _archive(tmp_path)
+    archive.add([{"timestamp": DAY, "pm25": 1.0}])
+
+    assert len(archive.rows("5min", 0, 2**62)) == 1
+    archive.close()
+
+
+def test_recycled_slots_are_not_covered(tmp_path) -> None:
+    """A tier only covers the range its ring still holds."""
+    name, step, length = TIERS[0]
+    archive = _archive(tmp_path)
+    archive.add(
+        [{"timestamp": DAY + step * n, "pm25": 1.0} for n in range(length + 10)]
+    )
+
+    assert not archive.covers(name, DAY, archive.last)
+    assert archive.covers(name, DAY + step * 10, archive.last)
+    assert archive.rows(name, 0, archive.last)[0]["timestamp"] == DAY + step * 10
+    archive.close()
+
+
+def test_reopening_keeps_the_data(tmp_path) -> None:
+    """The file survives a restart, a foreign file is started over."""
+    archive = _archive(tmp_path)
+    archive.add([{"timestamp": DAY, "pm25": 1.0}])
+    archive.close()
+
+    archive.open()
+    assert (archive.first, archive.last) == (DAY, DAY)
+    archive.close()
+
+    (tmp_path / "device.rrd").write_bytes(b"garbage")
+    archive.open()
+    assert archive.last is None
+    assert (tmp_path / "device.rrd").stat().st_size == FILE_SIZE
+    archive.close()
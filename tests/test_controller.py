@@ -0,0 +1,53 @@
+"""Tests for the local automatic fan control."""
+
+from custom_components.blueair.controller import (
+    MAX_COMMANDS,
+    MIN_DWELL,
+    PM25_STEPS,
+    RATE_WINDOW,
+    FanController,
+    _level,
+)
+
+
+def test_level_counts_the_steps_reached() -> None:
+    """Every step reached adds a level, a missing value is clean air."""
+    assert _level(None, PM25_STEPS, 0) == 0
+    assert _level(5.0, PM25_STEPS, 0) == 0
+    assert _level(40.0, PM25_STEPS, 0) == 2
+    assert _level(500.0, PM25_STEPS, 0) == len(PM25_STEPS)
+
+
+def test_level_holds_within_the_hysteresis() -> None:
+    """Just below a step keeps the level, well below it drops."""
+    assert _level(11.0, PM25_STEPS, 1) == 1
+    assert _level(9.0, PM25_STEPS, 1) == 0
+
+
+def test_speed_goes_up_at_once() -> None:
+    """Worse air raises the speed straight to the target."""
+    controller = FanController()
+    assert controller.next_speed(1, 4, 60.0, None, 0) == 4
+
+
+def test_worse_pollutant_decides() -> None:
+    """VOC can call for more speed than PM2.5."""
+    controller = FanController()
+    assert controller.target(1, 4, 5.0, 600.0) == 3
+
+
+def test_speed_goes_down_one_step_after_the_dwell() -> None:
+    """Better air lowers the speed one step, not before MIN_DWELL."""
+    controller = FanController()
+    controller.record(4, 0)
+    assert controller.next_speed(4, 4, 1.0, None, MIN_DWELL - 1) is None
+    assert controller.next_speed(4, 4, 1.0, None, MIN_DWELL) == 3
+
+
+def test_commands_are_rate_limited() -> None:
+    """No more than MAX_COMMANDS changes happen per RATE_WINDOW."""
+    controller = FanController()
+    for n in range(MAX_COMMANDS):
+        controller.record(2 + n % 2, n)
+    assert controller.next_speed(1, 4, 60.0, None, MAX_COMMANDS) is None
+    assert controller.next_speed(1, 4, 60.0, None, RATE_WINDOW) == 4
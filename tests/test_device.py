@@ -0,0 +1,206 @@
+"""Tests for the blueair device coordinator."""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.blueair import device as device_module
+from custom_components.blueair.archive import TimeSeriesArchive
+from custom_components.blueair.device import (
+    ATTRIBUTE_REFRESH_SECONDS,
+    CATCH_UP_PAGES,
+    CATCH_UP_RETRY,
+    COMMAND_SETTLE_SECONDS,
+    BlueairDataUpdateCoordinator,
+)
+from custom_components.blueair.fleet import POLL_INTERVAL, BlueairFleet
+
+
+def _device(hass: HomeAssistant, **attributes) -> BlueairDataUpdateCoordinator:
+    device = BlueairDataUpdateCoordinator(
+        hass, MagicMock(), "uuid", "Living room", BlueairFleet(hass), "account"
+    )
+    device._attribute.update(attributes)
+    return device
+
+
+async def test_speed_in_auto_mode_is_sent(hass: HomeAssistant) -> None:
+    """Setting the reported speed still takes the fan out of auto."""
+    device = _device(hass, fan_speed="2", mode="auto")
+    assert not device.is_current("fan_speed", 2)
+
+    await device.set_fan_speed(2)
+
+    device.api_client.set_fan_speed.assert_called_once_with("uuid", 2)
+    assert device.is_current("mode", "manual")
+    assert device.is_current("fan_speed", 2)
+    await device.fleet.async_shutdown()
+
+
+async def test_current_speed_in_manual_mode_is_skipped(hass: HomeAssistant) -> None:
+    """Nothing is sent when the fan already runs that speed in manual."""
+    device = _device(hass, fan_speed="2", mode="manual")
+
+    await device.set_fan_speed(2)
+
+    device.api_client.set_fan_speed.assert_not_called()
+    await device.fleet.async_shutdown()
+
+
+async def test_local_auto_waits_for_the_attributes_to_refresh(
+    hass: HomeAssistant,
+) -> None:
+    """Attributes predating a command don't stop local auto."""
+    device = _device(hass, fan_speed="1", mode="auto")
+    device._local_auto = True
+    device._last_success = time.time()
+    now = time.time()
+    device._local_auto_started = now - POLL_INTERVAL.total_seconds()
+    # Polled before the refresh that shows the speed local auto set
+    device._controller.record(3, now - ATTRIBUTE_REFRESH_SECONDS + 60)
+
+    await device._async_control()
+    assert device.local_auto
+    device.api_client.set_fan_speed.assert_not_called()
+
+    device._attribute["mode"] = "manual"
+    device._local_auto_started = now - COMMAND_SETTLE_SECONDS
+    device._controller.changed_at = now - COMMAND_SETTLE_SECONDS
+    await device._async_control()
+    assert not device.local_auto
+    await device.fleet.async_shutdown()
+
+
+async def test_learned_capabilities_survive_a_restart(hass: HomeAssistant) -> None:
+    """A restored device keeps the speeds and presets it reported before."""
+    device = _device(hass, fan_speed="4", mode="night")
+    device._learn_capabilities()
+    device._last_success = 1000.0
+    snapshot = device.snapshot()
+
+    restored = _device(hass)
+    restored.restore({**snapshot, "attribute": {"fan_speed": "1", "mode": "auto"}})
+
+    assert restored.speed_count == 4
+    assert "night" in restored._preset_modes
+    await device.fleet.async_shutdown()
+    await restored.fleet.async_shutdown()
+
+
+async def test_known_model_starts_with_its_speeds(
+    hass: HomeAssistant, monkeypatch
+) -> None:
+    """Speeds of a known model are offered before it reports them."""
+    monkeypatch.setitem(device_module.MODEL_SPEED_COUNTS, "pro_xl", 5)
+    device = _device(hass, fan_speed="1")
+    device._device_information["compatibility"] = "pro_xl"
+
+    device._learn_capabilities()
+
+    assert device.speed_count == 5
+    await device.fleet.async_shutdown()
+
+
+async def test_catch_up_backs_off_and_resumes(hass: HomeAssistant) -> None:
+    """A failed page is retried later, pages fetched before are kept."""
+    device = _device(hass, fan_speed="3")
+    device._history.extend([{"timestamp": int(time.time()), "pm25": 5.0}], 0)
+    device._archive_synced = True
+    pages = []
+
+    def fetch(uuid, start, end):
+        pages.append(start)
+        if len(pages) == 2:
+            raise OSError("unreachable")
+        return [{"timestamp": start, "pm25": 5.0}]
+
+    device.api_client.iter_data_points_between.side_effect = fetch
+
+    await device._catch_up()
+    assert len(pages) == 2
+    assert len(device._catch_up_rows) == 1
+    assert not device._forecast.seeded
+
+    # Backing off, nothing is fetched
+    await device._catch_up()
+    assert len(pages) == 2
+
+    device._catch_up_retry_at = 0
+    while not device._forecast.seeded:
+        await device._catch_up()
+    assert pages[2] == pages[1]
+    assert pages == sorted(pages)
+    assert device._catch_up_delay == CATCH_UP_RETRY
+    await device.fleet.async_shutdown()
+
+
+async def test_refresh_doesnt_wait_for_the_catch_up(hass: HomeAssistant) -> None:
+    """Refreshes finish while one catch-up fetches history beside them."""
+    device = _device(hass)
+    now = int(time.time())
+    device._archive_synced = True
+    device.api_client.get_info.return_value = {}
+    device.api_client.get_latest_data_points.return_value = [
+        {"timestamp": now, "pm25": 5.0}
+    ]
+    device.api_client.get_data_points_after.return_value = []
+    device.api_client.get_attributes.return_value = {"fan_speed": "2"}
+    release = threading.Event()
+    pages = []
+
+    def fetch(uuid, start, end):
+        pages.append(start)
+        release.wait(5)
+        return []
+
+    device.api_client.iter_data_points_between.side_effect = fetch
+
+    await device.async_refresh()
+    await device.async_refresh()
+    assert device.last_update_success
+    assert len(pages) == 1
+    assert not device._forecast.seeded
+
+    release.set()
+    await device._catch_up_task
+    assert device._catch_up_task is None
+    assert len(pages) == CATCH_UP_PAGES
+
+    # The next refresh carries on where the last catch-up stopped
+    await device.async_refresh()
+    await device._catch_up_task
+    assert pages == sorted(pages)
+    assert len(pages) == 2 * CATCH_UP_PAGES
+    await device.fleet.async_shutdown()
+
+
+async def test_archive_closed_while_opening_stays_closed(
+    hass: HomeAssistant, tmp_path
+) -> None:
+    """A device removed during the open doesn't map its file again."""
+    device = _device(hass, fan_speed="3")
+    device._history.extend([{"timestamp": int(time.time()), "pm25": 5.0}], 0)
+    device.api_client.iter_data_points_between.return_value = []
+    archive = device._archive = TimeSeriesArchive(str(tmp_path / "device.rrd"))
+    release = threading.Event()
+    open_archive = archive.open
+
+    def slow_open():
+        release.wait(5)
+        open_archive()
+
+    archive.open = slow_open
+    catch_up = hass.async_create_task(device._catch_up())
+    await asyncio.sleep(0.05)
+    closing = hass.async_create_task(device.async_close_archive())
+    await asyncio.sleep(0.05)
+    assert not closing.done()
+
+    release.set()
+    await closing
+    await catch_up
+    assert not archive.is_open
+    await device.fleet.async_shutdown()
@@ -0,0 +1,82 @@
+"""Tests for the BlueAir history export."""
+
+import csv
+import gzip
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.blueair.const import DOMAIN
+from custom_components.blueair.export import (
+    FORMAT_CSV,
+    ExportCheckpoint,
+    async_export_history,
+    write_window,
+)
+from custom_components.blueair.fleet import BlueairFleet
+
+
+def _chunk(*timestamps):
+    return {"timestamp": list(timestamps), "pm25": [1.0] * len(timestamps)}
+
+
+def _read(path):
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as file:
+        return list(csv.reader(file))
+
+
+def test_resume_cuts_off_rows_written_after_the_checkpoint(tmp_path):
+    """Rows of an interrupted window are not written twice."""
+    directory = str(tmp_path)
+    path = tmp_path / "device.csv.gz"
+    checkpoint = ExportCheckpoint(directory)
+
+    position = write_window(
+        "device", 0, 600, [_chunk(0, 300)], directory, FORMAT_CSV, checkpoint
+    )
+    assert position == 301
+    assert checkpoint.get("device") == (301, path.stat().st_size)
+
+    # A window whose rows were written but whose checkpoint never was
+    with gzip.open(path, "at", newline="", encoding="utf-8") as file:
+        csv.writer(file).writerow([600, 1.0])
+
+    checkpoint = ExportCheckpoint(directory)
+    write_window(
+        "device", 301, 1200, [_chunk(600, 900)], directory, FORMAT_CSV, checkpoint
+    )
+
+    assert _read(path) == [
+        ["timestamp", "pm25"],
+        ["0", "1.0"],
+        ["300", "1.0"],
+        ["600", "1.0"],
+        ["900", "1.0"],
+    ]
+
+
+async def test_exports_of_different_ranges_are_separate(
+    hass: HomeAssistant, tmp_path
+) -> None:
+    """A later export of an earlier range writes its own rows."""
+    entry = MockConfigEntry(domain=DOMAIN)
+    entry.add_to_hass(hass)
+    client = MagicMock()
+    client.iter_data_point_columns_between.side_effect = (
+        lambda uuid, start, end, chunk_size: [
+            _chunk(timestamp) for timestamp in (0, 1000) if start <= timestamp < end
+        ]
+    )
+    device = SimpleNamespace(
+        id="device", account=entry.entry_id, api_client=client, fleet=BlueairFleet(hass)
+    )
+
+    await async_export_history(hass, [device], 1000, 2000, str(tmp_path), FORMAT_CSV)
+    await async_export_history(hass, [device], 0, 500, str(tmp_path), FORMAT_CSV)
+
+    assert _read(tmp_path / "1000-2000" / "device.csv.gz")[1:] == [["1000", "1.0"]]
+    assert _read(tmp_path / "0-500" / "device.csv.gz")[1:] == [["0", "1.0"]]
+    await device.fleet.async_shutdown()
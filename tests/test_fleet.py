@@ -0,0 +1,217 @@
+"""Tests for the fleet shared by the blueair config entries."""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.blueair import fleet as fleet_module
+from custom_components.blueair.blueair import transport as transport_module
+from custom_components.blueair.blueair.transport import Transport
+from custom_components.blueair.fleet import (
+    _GROUP_WINDOW,
+    MAX_CONCURRENT_JOBS,
+    SHED_LAG,
+    SHED_QUEUED,
+    BlueairFleet,
+    LoadShedder,
+    PollSchedule,
+)
+
+
+async def _until(condition) -> None:
+    """Wait for the event loop to make a condition true."""
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition never became true")
+
+
+async def test_timed_out_job_keeps_its_slot(
+    hass: HomeAssistant, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A job that timed out holds its slot until its thread is done."""
+    monkeypatch.setattr(fleet_module, "JOB_TIMEOUT", 0.05)
+    fleet = BlueairFleet(hass)
+    release = threading.Event()
+
+    with pytest.raises(TimeoutError):
+        await fleet.async_add_job("account", release.wait, 5)
+
+    stats = fleet.executor_stats()
+    assert stats["running"] == 1
+    assert stats["stranded"] == 1
+    assert fleet._semaphore._value == MAX_CONCURRENT_JOBS - 1
+
+    release.set()
+    await _until(lambda: fleet.executor_stats()["running"] == 0)
+    assert fleet.executor_stats()["stranded"] == 0
+    assert fleet._semaphore._value == MAX_CONCURRENT_JOBS
+    await fleet.async_shutdown()
+
+
+async def test_stranded_jobs_hold_back_new_ones(
+    hass: HomeAssistant, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """No more than MAX_CONCURRENT_JOBS threads run, stranded or not."""
+    monkeypatch.setattr(fleet_module, "JOB_TIMEOUT", 0.05)
+    fleet = BlueairFleet(hass)
+    release = threading.Event()
+
+    for _ in range(MAX_CONCURRENT_JOBS):
+        with pytest.raises(TimeoutError):
+            await fleet.async_add_job("account", release.wait, 5)
+    waiting = hass.async_create_task(fleet.async_add_job("account", lambda: 42))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    assert fleet.executor_stats()["queued"] == 1
+
+    release.set()
+    assert await waiting == 42
+    await fleet.async_shutdown()
+
+
+async def test_removed_account_strands_its_running_jobs(hass: HomeAssistant) -> None:
+    """Removing an account cancels its callers, not its threads."""
+    fleet = BlueairFleet(hass)
+    release = threading.Event()
+    job = hass.async_create_task(fleet.async_add_job("account", release.wait, 5))
+    await _until(lambda: fleet.executor_stats()["running"] == 1)
+
+    fleet.async_remove_account("account")
+    with pytest.raises(asyncio.CancelledError):
+        await job
+    assert fleet.executor_stats()["stranded"] == 1
+
+    release.set()
+    await _until(lambda: fleet.executor_stats()["stranded"] == 0)
+    await fleet.async_shutdown()
+
+
+async def test_hung_request_gives_back_its_slot(
+    hass: HomeAssistant, monkeypatch: pytest.MonkeyPatch, socket_enabled: None
+) -> None:
+    """A server that never answers only holds a slot until the read timeout."""
+    assert sum(transport_module.REQUEST_TIMEOUT) < fleet_module.JOB_TIMEOUT
+    monkeypatch.setattr(fleet_module, "JOB_TIMEOUT", 0.05)
+    monkeypatch.setattr(transport_module, "REQUEST_TIMEOUT", (0.2, 0.2))
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    # Connections wait in the backlog, their requests are never read
+    server.listen()
+    transport = Transport()
+    url = "http://127.0.0.1:%d/" % server.getsockname()[1]
+    fleet = BlueairFleet(hass)
+
+    with pytest.raises(TimeoutError):
+        await fleet.async_add_job("account", transport.get, url)
+    assert fleet.executor_stats()["stranded"] == 1
+
+    await _until(lambda: fleet.executor_stats()["running"] == 0)
+    assert fleet._semaphore._value == MAX_CONCURRENT_JOBS
+    server.close()
+    transport.session.close()
+    await fleet.async_shutdown()
+
+
+def _close_pair(interval: float) -> tuple[str, str]:
+    """Return two devices whose phases are within the group window."""
+    phases = sorted(
+        (BlueairFleet.phase(f"device-{n}") % interval, f"device-{n}")
+        for n in range(1000)
+    )
+    for (first, a), (second, b) in zip(phases, phases[1:]):
+        if 0 < second - first < _GROUP_WINDOW:
+            return a, b
+    raise AssertionError("no devices with close phases")
+
+
+def test_poll_schedule_polls_a_group_once_per_interval() -> None:
+    """Devices polled together aren't due again before the next interval."""
+    interval = 60.0
+    a, b = _close_pair(interval)
+    schedule = PollSchedule(interval)
+
+    polls = []
+    now = 0.0
+    for _ in range(5):
+        at, group = schedule.next_group([a, b], now)
+        now = max(now, at)
+        polls.append((at, sorted(group)))
+        schedule.advance(group, now)
+
+    assert [group for _, group in polls] == [sorted([a, b])] * 5
+    gaps = [later - earlier for (earlier, _), (later, _) in zip(polls, polls[1:])]
+    assert gaps == pytest.approx([interval] * 4)
+
+
+def test_poll_schedule_skips_missed_intervals() -> None:
+    """A stalled loop resumes at the next phase instead of catching up."""
+    schedule = PollSchedule(60.0)
+    at, group = schedule.next_group(["device"], 0.0)
+    schedule.advance(group, at + 600)
+
+    later, _ = schedule.next_group(["device"], at + 600)
+    assert later == pytest.approx(at + 660)
+
+
+def test_load_shedder_ignores_a_single_slow_callback() -> None:
+    """One lag spike is smoothed away instead of shedding load."""
+    shedder = LoadShedder()
+    assert not shedder.update(SHED_LAG[0] * 2, 0)
+    assert shedder.level == 0
+
+
+def test_load_shedder_follows_sustained_lag() -> None:
+    """Sustained lag raises the level up to the matching threshold."""
+    shedder = LoadShedder()
+    for _ in range(20):
+        shedder.update(SHED_LAG[1] * 2, 0)
+    assert shedder.level == 2
+
+
+def test_load_shedder_reacts_to_queued_jobs_at_once() -> None:
+    """A deep executor queue sheds load without waiting for the average."""
+    shedder = LoadShedder()
+    assert shedder.update(0.0, SHED_QUEUED[1])
+    assert shedder.level == 2
+
+
+def test_load_shedder_recovers_one_level_at_a_time() -> None:
+    """The level drops by at most one per measurement."""
+    shedder = LoadShedder()
+    shedder.update(0.0, SHED_QUEUED[1])
+
+    assert shedder.update(0.0, 0)
+    assert shedder.level == 1
+    assert shedder.update(0.0, 0)
+    assert shedder.level == 0
+    assert not shedder.update(0.0, 0)
+
+
+async def test_warm_up_shares_the_slots(
+    hass: HomeAssistant, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Warm-up connections are fleet jobs, they don't add threads."""
+    fleet = BlueairFleet(hass)
+    release = threading.Event()
+    monkeypatch.setattr(fleet.transport, "warm_up", lambda url: release.wait(5))
+
+    warm_up = hass.async_create_task(
+        fleet.async_warm_up("account", "https://example.invalid/")
+    )
+    await _until(
+        lambda: fleet.executor_stats()["running"] == fleet_module.WARM_CONNECTIONS
+    )
+    assert (
+        fleet._semaphore._value
+        == MAX_CONCURRENT_JOBS - fleet_module.WARM_CONNECTIONS
+    )
+
+    release.set()
+    await warm_up
+    await fleet.async_shutdown()
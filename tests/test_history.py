@@ -0,0 +1,75 @@
+"""Tests for the in-memory datapoint history."""
+
+from custom_components.blueair.blueair.blueair import DEFAULT_SAMPLE_PERIOD
+from custom_components.blueair.history import DatapointHistory
+
+PERIOD = DEFAULT_SAMPLE_PERIOD
+
+
+def _row(timestamp: int, pm25: float = 1.0) -> dict:
+    return {"timestamp": timestamp, "pm25": pm25}
+
+
+def test_sample_inside_its_period_is_pending() -> None:
+    """The newest sample waits for its period to end before it is final."""
+    history = DatapointHistory()
+
+    final = history.extend([_row(0), _row(PERIOD)], PERIOD + 10)
+
+    assert final == [_row(0)]
+    assert history.pending == _row(PERIOD)
+    assert history.latest == _row(PERIOD)
+    assert history.cursor == 0
+
+
+def test_fresher_copy_replaces_the_pending_sample() -> None:
+    """A pending sample fetched again carries its newer values."""
+    history = DatapointHistory()
+    history.extend([_row(PERIOD, 1.0)], PERIOD + 10)
+
+    history.extend([_row(PERIOD, 5.0)], PERIOD + 200)
+
+    assert history.pending == _row(PERIOD, 5.0)
+    assert list(history.rows) == []
+
+
+def test_pending_sample_is_final_at_the_period_boundary() -> None:
+    """Once its period ended the pending sample moves to the rows."""
+    history = DatapointHistory()
+    history.extend([_row(PERIOD, 1.0)], PERIOD + 10)
+
+    final = history.extend([], 2 * PERIOD)
+
+    assert final == [_row(PERIOD, 1.0)]
+    assert history.pending is None
+    assert history.cursor == PERIOD
+
+
+def test_cursor_with_only_a_pending_sample() -> None:
+    """The pending sample is fetched again until it is final."""
+    history = DatapointHistory()
+    assert history.cursor is None
+
+    history.extend([_row(PERIOD)], PERIOD + 10)
+
+    assert history.cursor == PERIOD - 1
+
+
+def test_rows_already_final_are_ignored() -> None:
+    """Overlapping fetches don't duplicate finalized samples."""
+    history = DatapointHistory()
+    history.extend([_row(0), _row(PERIOD)], 3 * PERIOD)
+
+    final = history.extend([_row(0), _row(PERIOD), _row(2 * PERIOD)], 4 * PERIOD)
+
+    assert final == [_row(2 * PERIOD)]
+    assert [row["timestamp"] for row in history.rows] == [0, PERIOD, 2 * PERIOD]
+
+
+def test_history_keeps_the_newest_rows() -> None:
+    """The ring buffer drops the oldest samples."""
+    history = DatapointHistory(maxlen=2)
+
+    history.extend([_row(n * PERIOD) for n in range(4)], 10 * PERIOD)
+
+    assert [row["timestamp"] for row in history.rows] == [2 * PERIOD, 3 * PERIOD]
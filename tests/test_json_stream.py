@@ -0,0 +1,55 @@
+"""Tests for the incremental datapoint response parser."""
+
+import json
+
+import pytest
+
+from custom_components.blueair.blueair.json_stream import iter_data_point_rows
+
+RESPONSE = {
+    "uuid": "device",
+    "sensors": ["time", "pm25", "voc"],
+    "datapoints": [[1700000000, 12.5, 301], [1700000300, 1234567.25, -4]],
+}
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 4096])
+def test_rows_match_whatever_the_chunking(size: int) -> None:
+    """Values split across chunks, numbers included, are parsed whole."""
+    data = json.dumps(RESPONSE, indent=1).encode()
+
+    rows = list(iter_data_point_rows(_chunks(data, size)))
+
+    assert rows == [RESPONSE["sensors"], *RESPONSE["datapoints"]]
+
+
+def test_rows_before_the_sensors_are_buffered() -> None:
+    """The sensor names always come first."""
+    response = {"datapoints": RESPONSE["datapoints"], "sensors": ["time", "pm25"]}
+    data = json.dumps(response).encode()
+
+    rows = list(iter_data_point_rows(_chunks(data, 3)))
+
+    assert rows == [["time", "pm25"], *RESPONSE["datapoints"]]
+
+
+def test_multibyte_characters_split_across_chunks() -> None:
+    """UTF-8 sequences cut by a chunk boundary are decoded."""
+    data = json.dumps({"sensors": ["µg"], "datapoints": []}, ensure_ascii=False)
+
+    rows = list(iter_data_point_rows(_chunks(data.encode(), 1)))
+
+    assert rows == [["µg"]]
+
+
+@pytest.mark.parametrize(
+    "data", [b'{"datapoints": []}', b'{"sensors": ["time"], "datapoints": [[1'],
+)
+def test_incomplete_responses_raise(data: bytes) -> None:
+    """Missing sensors or a truncated body are errors, not empty results."""
+    with pytest.raises(ValueError):
+        list(iter_data_point_rows(_chunks(data, 4)))
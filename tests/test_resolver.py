@@ -0,0 +1,118 @@
+"""Tests for the DNS cache of the Blueair clients."""
+
+import socket
+
+import pytest
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util import connection
+
+from custom_components.blueair.blueair import resolver
+from custom_components.blueair.blueair.resolver import DnsCache, _resolving_pool
+
+HOST = "api.example.com"
+ADDRESSES = ["192.0.2.1", "192.0.2.2"]
+
+
+def _infos(addresses: list[str]) -> list[tuple]:
+    # The resolver lists an address once per protocol
+    return [
+        (socket.AF_INET, socket.SOCK_STREAM, proto, "", (address, 443))
+        for address in addresses
+        for proto in (6, 0)
+    ]
+
+
+@pytest.fixture
+def lookups(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Answer lookups with ADDRESSES and record the looked up hosts."""
+    hosts = []
+
+    def getaddrinfo(host, port, type=0):
+        hosts.append(host)
+        return _infos(ADDRESSES)
+
+    monkeypatch.setattr(resolver.socket, "getaddrinfo", getaddrinfo)
+    return hosts
+
+
+def test_resolve_caches_every_address(lookups: list[str]) -> None:
+    """All addresses are returned once, in order, and cached."""
+    cache = DnsCache()
+
+    assert cache.resolve(HOST, 443) == ADDRESSES
+    assert cache.resolve(HOST, 443) == ADDRESSES
+    assert lookups == [HOST]
+    assert cache.snapshot() == {"hosts": [HOST], "hits": 1, "lookups": 1}
+
+
+def test_failed_lookup_uses_the_expired_addresses(
+    lookups: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A resolver hiccup doesn't fail a host that was resolved before."""
+    cache = DnsCache(ttl=0)
+    cache.resolve(HOST, 443)
+
+    def fail(*args, **kwargs):
+        raise socket.gaierror("temporary failure")
+
+    monkeypatch.setattr(resolver.socket, "getaddrinfo", fail)
+
+    assert cache.resolve(HOST, 443) == ADDRESSES
+    assert cache.resolve("other.example.com", 443) == ["other.example.com"]
+
+
+def test_forget_drops_one_address(lookups: list[str]) -> None:
+    """Failed addresses are dropped, the host once none is left."""
+    cache = DnsCache()
+    cache.resolve(HOST, 443)
+
+    cache.forget(HOST, 443, ADDRESSES[0])
+    assert cache.resolve(HOST, 443) == ADDRESSES[1:]
+
+    cache.forget(HOST, 443, ADDRESSES[1])
+    assert cache.snapshot()["hosts"] == []
+
+
+def test_connection_falls_back_to_the_next_address(
+    lookups: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An unreachable address doesn't fail the connection."""
+    tried = []
+    sock = object()
+
+    def create_connection(address, *args, **kwargs):
+        tried.append(address[0])
+        if address[0] == ADDRESSES[0]:
+            raise OSError("unreachable")
+        return sock
+
+    monkeypatch.setattr(connection, "create_connection", create_connection)
+    cache = DnsCache()
+    pool = _resolving_pool(HTTPConnectionPool, HTTPConnection, cache)
+    conn = pool.ConnectionCls(HOST, 443)
+
+    assert conn._new_conn() is sock
+    assert tried == ADDRESSES
+    assert conn._dns_host == HOST
+    # Later connections skip the unreachable address
+    assert cache.resolve(HOST, 443) == ADDRESSES[1:]
+
+
+def test_connection_fails_when_every_address_does(
+    lookups: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The last error is raised and the host looked up again next time."""
+
+    def create_connection(address, *args, **kwargs):
+        raise OSError("unreachable")
+
+    monkeypatch.setattr(connection, "create_connection", create_connection)
+    cache = DnsCache()
+    pool = _resolving_pool(HTTPConnectionPool, HTTPConnection, cache)
+    conn = pool.ConnectionCls(HOST, 443)
+
+    with pytest.raises(NewConnectionError):
+        conn._new_conn()
+    assert cache.snapshot()["hosts"] == []
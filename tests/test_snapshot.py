@@ -0,0 +1,135 @@
+"""Tests for the persisted device snapshots."""
+
+from datetime import timedelta
+from typing import Any
+from unittest.mock import MagicMock
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.blueair.const import DOMAIN
+from custom_components.blueair.device import BlueairDataUpdateCoordinator
+from custom_components.blueair.fleet import BlueairFleet
+from custom_components.blueair.snapshot import (
+    SAVE_DELAY,
+    STORAGE_VERSION,
+    SnapshotStore,
+)
+
+KEY = f"{DOMAIN}.entry"
+
+
+def _device(hass: HomeAssistant) -> BlueairDataUpdateCoordinator:
+    return BlueairDataUpdateCoordinator(
+        hass, MagicMock(), "uuid", "Living room", BlueairFleet(hass), "account"
+    )
+
+
+def _snapshot() -> dict[str, Any]:
+    return {
+        "device_information": {"nickname": "Living room"},
+        "datapoint": {"timestamp": 1000, "pm25": 5.0},
+        "attribute": {"fan_speed": "2", "mode": "manual"},
+        "updated": 1000.0,
+    }
+
+
+def _saved(hass_storage: dict[str, Any]) -> dict[str, Any] | None:
+    if KEY not in hass_storage:
+        return None
+    return hass_storage[KEY]["data"]
+
+
+async def test_restore(hass: HomeAssistant, hass_storage: dict[str, Any]) -> None:
+    """A saved device serves its snapshot, others are left alone."""
+    hass_storage[KEY] = {
+        "version": STORAGE_VERSION,
+        "key": KEY,
+        "data": {"uuid": _snapshot()},
+    }
+    device = _device(hass)
+    other = BlueairDataUpdateCoordinator(
+        hass, MagicMock(), "other", "Bedroom", device.fleet, "account"
+    )
+    snapshots = SnapshotStore(hass, "entry", [device, other])
+    await snapshots.async_load()
+
+    assert snapshots.async_restore(device)
+    assert not snapshots.async_restore(other)
+    assert device.is_stale
+    assert device.device_name == "Living room"
+    assert device.is_current("fan_speed", 2)
+    assert device.snapshot()["datapoint"] == _snapshot()["datapoint"]
+    await device.fleet.async_shutdown()
+
+
+async def test_failed_refresh_serves_the_snapshot(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """A restored device keeps its data when the revalidation fails."""
+    hass_storage[KEY] = {
+        "version": STORAGE_VERSION,
+        "key": KEY,
+        "data": {"uuid": _snapshot()},
+    }
+    device = _device(hass)
+    snapshots = SnapshotStore(hass, "entry", [device])
+    await snapshots.async_load()
+    snapshots.async_restore(device)
+    device.api_client.get_info.side_effect = OSError("unreachable")
+    updates = []
+    device.async_add_listener(lambda: updates.append(device.is_stale))
+
+    await device.async_refresh()
+
+    assert device.last_update_success
+    assert device.is_stale
+    assert updates and all(updates)
+    assert device.snapshot()["updated"] == 1000.0
+    assert device.is_current("fan_speed", 2)
+    await device.fleet.async_shutdown()
+
+
+async def test_updates_dont_push_the_save_back(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Polls more frequent than the delay still get saved."""
+    device = _device(hass)
+    device.restore(_snapshot())
+    snapshots = SnapshotStore(hass, "entry", [device])
+    start = dt_util.utcnow()
+
+    snapshots.async_schedule_save()
+    async_fire_time_changed(hass, start + timedelta(seconds=SAVE_DELAY - 60))
+    await hass.async_block_till_done()
+    snapshots.async_schedule_save()
+    assert _saved(hass_storage) is None
+
+    async_fire_time_changed(hass, start + timedelta(seconds=SAVE_DELAY + 1))
+    await hass.async_block_till_done()
+    assert _saved(hass_storage)["uuid"]["updated"] == 1000.0
+
+    # The next update schedules a new save
+    device._last_success = 2000.0
+    snapshots.async_schedule_save()
+    async_fire_time_changed(hass, start + timedelta(seconds=2 * SAVE_DELAY + 2))
+    await hass.async_block_till_done()
+    assert _saved(hass_storage)["uuid"]["updated"] == 2000.0
+    await device.fleet.async_shutdown()
+
+
+async def test_save_flushes_right_away(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Unloading writes the snapshots without waiting for the delay."""
+    device = _device(hass)
+    device.restore(_snapshot())
+    snapshots = SnapshotStore(hass, "entry", [device])
+    snapshots.async_schedule_save()
+
+    await snapshots.async_save()
+
+    assert _saved(hass_storage)["uuid"]["updated"] == 1000.0
+    await device.fleet.async_shutdown()
@@ -0,0 +1,177 @@
+"""Tests for the HTTP transport of the Blueair clients."""
+
+import gzip
+import io
+import json
+
+import pytest
+import requests
+from urllib3 import HTTPResponse
+
+from custom_components.blueair.blueair.transport import (
+    MetricsMiddleware,
+    RecordMiddleware,
+    ReplayMiddleware,
+    Request,
+    RetryMiddleware,
+    Transport,
+    build_response,
+)
+
+LOGIN_URL = "https://api.blueair.io/v2/user/me@example.com/login/"
+
+
+class FakeServer:
+    """Answer requests with queued responses or errors, last one repeats."""
+
+    def __init__(self, *answers) -> None:
+        self.answers = list(answers)
+        self.requests: list[Request] = []
+
+    def __call__(self, request: Request, call_next) -> requests.Response:
+        self.requests.append(request)
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers, content = answer
+        return build_response(request.url, status, headers, content)
+
+
+def test_middleware_runs_in_order() -> None:
+    """Every middleware sees the request on its way to the last one."""
+    calls = []
+
+    def middleware(name):
+        def call(request, call_next):
+            calls.append(name)
+            return call_next(request)
+
+        return call
+
+    server = FakeServer((200, {}, b"ok"))
+    transport = Transport(middleware=[middleware("a"), middleware("b"), server])
+
+    response = transport.get("https://example.com/")
+
+    assert response.content == b"ok"
+    assert calls == ["a", "b"]
+    assert server.requests[0].method == "GET"
+
+
+def test_retry_server_errors_and_connection_errors() -> None:
+    """Failed GETs are retried until one succeeds."""
+    server = FakeServer(
+        (503, {}, b""), requests.ConnectionError("reset"), (200, {}, b"ok")
+    )
+    transport = Transport(middleware=[RetryMiddleware(backoff=0), server])
+
+    assert transport.get("https://example.com/").status_code == 200
+    assert len(server.requests) == 3
+
+
+def test_retry_gives_up() -> None:
+    """The last attempt is returned, or raised, as is."""
+    server = FakeServer((503, {}, b""))
+    transport = Transport(middleware=[RetryMiddleware(backoff=0), server])
+    assert transport.get("https://example.com/").status_code == 503
+    assert len(server.requests) == 3
+
+    server = FakeServer(requests.ConnectionError("reset"))
+    transport = Transport(middleware=[RetryMiddleware(backoff=0), server])
+    with pytest.raises(requests.ConnectionError):
+        transport.get("https://example.com/")
+
+
+def test_post_is_not_retried() -> None:
+    """Requests that may change something are sent once."""
+    server = FakeServer((503, {}, b""))
+    transport = Transport(middleware=[RetryMiddleware(backoff=0), server])
+
+    assert transport.post("https://example.com/").status_code == 503
+    assert len(server.requests) == 1
+
+
+def test_record_leaves_out_credentials(tmp_path) -> None:
+    """Fixtures contain neither tokens nor the username."""
+    path = tmp_path / "fixture.jsonl"
+    server = FakeServer((200, {"X-AUTH-TOKEN": "secret-token"}, b"{}"))
+    transport = Transport(middleware=[RecordMiddleware(str(path)), server])
+
+    response = transport.get(LOGIN_URL, headers={"Authorization": "Basic secret"})
+
+    assert response.headers["X-AUTH-TOKEN"] == "secret-token"
+    recorded = path.read_text()
+    assert "secret" not in recorded
+    assert "me@example.com" not in recorded
+    record = json.loads(recorded)
+    assert record["url"] == "https://api.blueair.io/v2/user/{username}/login/"
+    assert record["headers"]["X-AUTH-TOKEN"] == "REDACTED"
+
+
+def test_replay_answers_recorded_requests(tmp_path) -> None:
+    """Recorded answers come back in order, for any username and timestamp."""
+    path = tmp_path / "fixture.jsonl"
+    url = "https://api.blueair.io/v2/user/me@example.com/device/1600000000/"
+    server = FakeServer((200, {}, b"first"), (200, {}, b"second"))
+    recorder = Transport(middleware=[RecordMiddleware(str(path)), server])
+    recorder.get(url)
+    recorder.get(url)
+
+    replay = Transport(middleware=[ReplayMiddleware(str(path))])
+    other = "https://api.blueair.io/v2/user/you@example.com/device/1700000000/"
+
+    assert replay.get(other).content == b"first"
+    assert replay.get(other).content == b"second"
+    assert replay.get(other).content == b"second"
+    with pytest.raises(requests.ConnectionError):
+        replay.post(other)
+
+
+class ChunkedServer:
+    """Answer with a gzipped body without a Content-Length, like chunked."""
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+
+    def __call__(self, request: Request, call_next) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.raw = HTTPResponse(
+            body=io.BytesIO(gzip.compress(self.body)),
+            headers={"Content-Encoding": "gzip"},
+            status=200,
+            preload_content=False,
+        )
+        if not request.kwargs.get("stream"):
+            # As requests does for responses that aren't streamed
+            response.content  # noqa: B018
+        return response
+
+
+def test_metrics_count_bytes_read_from_the_connection() -> None:
+    """Compressed responses count as received and as decoded."""
+    body = b"[" + b"1," * 1000 + b"1]"
+    metrics = MetricsMiddleware()
+    transport = Transport(middleware=[metrics, ChunkedServer(body)])
+
+    transport.get("https://example.com/")
+
+    counted = metrics.snapshot()["example.com"]
+    assert counted["bytes"] == len(gzip.compress(body))
+    assert counted["decoded_bytes"] == len(body)
+
+
+def test_metrics_count_streamed_bytes_once_closed() -> None:
+    """Streamed responses count what was read when the caller closes them."""
+    body = b"[" + b"1," * 1000 + b"1]"
+    metrics = MetricsMiddleware()
+    transport = Transport(middleware=[metrics, ChunkedServer(body)])
+
+    with transport.get("https://example.com/", stream=True) as response:
+        assert b"".join(response.iter_content(64)) == body
+        assert metrics.snapshot()["example.com"]["bytes"] == 0
+
+    counted = metrics.snapshot()["example.com"]
+    assert counted["requests"] == 1
+    assert counted["bytes"] == len(gzip.compress(body))
@@ -0,0 +1,33 @@
+"""Tests for the blueair websocket API."""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant
+
+from custom_components.blueair.websocket_api import MAX_HISTORY_SPAN, ws_history
+
+
+@pytest.mark.parametrize(
+    ("start", "end"),
+    [(1000, 999), (0, MAX_HISTORY_SPAN + 1)],
+)
+async def test_history_rejects_bad_ranges(
+    hass: HomeAssistant, start: int, end: int
+) -> None:
+    """Reversed and too long ranges are refused before fetching anything."""
+    connection = MagicMock()
+    msg = {
+        "id": 1,
+        "type": "blueair/history",
+        "entity_id": "fan.living_room",
+        "start": start,
+        "end": end,
+    }
+
+    await ws_history.__wrapped__(hass, connection, msg)
+
+    connection.send_error.assert_called_once()
+    assert connection.send_error.call_args[0][1] == websocket_api.ERR_INVALID_FORMAT
@@ -0,0 +1,152 @@
+"""Tests for the polling worker and its supervision."""
+
+from datetime import timedelta
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.blueair.blueair.worker import Poller, _changes
+from custom_components.blueair.worker import (
+    MAX_RESTART_DELAY,
+    RESTART_DELAY,
+    STABLE_SECONDS,
+    BlueairWorker,
+)
+
+
+def _client() -> MagicMock:
+    client = MagicMock()
+    client.get_info.return_value = {"nickname": "Living room"}
+    client.get_attributes.return_value = {"fan_speed": "1", "mode": "auto"}
+    client.get_latest_data_points.return_value = [
+        {"timestamp": 1000, "pm25": 5.0},
+        {"timestamp": 1300, "pm25": 6.0},
+    ]
+    client.get_data_points_after.return_value = [{"timestamp": 1300, "pm25": 7.0}]
+    return client
+
+
+def test_changes() -> None:
+    """Changed and new keys are reported, removed ones as None."""
+    old = {"same": 1, "changed": 1, "removed": 1}
+    new = {"same": 1, "changed": 2, "added": 3}
+
+    assert _changes(old, new) == {"changed": 2, "added": 3, "removed": None}
+
+
+def test_poll_keeps_the_cursor_before_the_newest_datapoint() -> None:
+    """The newest sample is fetched again until its values are final."""
+    client = _client()
+    poller = Poller(client, {"uuid": None}, 60)
+
+    message = poller.poll("uuid")
+
+    assert message[0:2] == ("update", "uuid")
+    assert message[4] == ["timestamp", "pm25"]
+    assert message[5] == [(1000, 5.0), (1300, 6.0)]
+    assert poller.cursors["uuid"] == 1299
+
+    poller.poll("uuid")
+    client.get_data_points_after.assert_called_once_with("uuid", 1299)
+    assert poller.cursors["uuid"] == 1299
+
+
+def test_poll_reports_only_changes() -> None:
+    """The first poll reports everything, the next ones what changed."""
+    client = _client()
+    poller = Poller(client, {"uuid": 1299}, 60)
+
+    first = poller.poll("uuid")
+    client.get_attributes.return_value = {"fan_speed": "2"}
+    second = poller.poll("uuid")
+
+    assert first[2] == {"nickname": "Living room"}
+    assert first[3] == {"fan_speed": "1", "mode": "auto"}
+    assert second[2] == {}
+    assert second[3] == {"fan_speed": "2", "mode": None}
+
+
+def test_poll_without_datapoints() -> None:
+    """Devices without datapoints still report their attributes."""
+    client = _client()
+    client.get_latest_data_points.side_effect = ValueError("classic")
+    poller = Poller(client, {"uuid": None}, 60)
+
+    message = poller.poll("uuid")
+
+    assert message[4:] == ([], [])
+    assert poller.cursors["uuid"] is None
+    assert message[3] == {"fan_speed": "1", "mode": "auto"}
+
+
+def test_set_devices_keeps_known_devices() -> None:
+    """Known devices keep their state, new ones are spread out."""
+    poller = Poller(_client(), {"a": 1299, "b": None}, 60)
+    poller.poll("a")
+    due = poller.due["a"]
+
+    poller.set_devices({"a": None, "c": 100})
+
+    assert set(poller.cursors) == {"a", "c"}
+    assert poller.cursors["a"] == 1299
+    assert poller.due["a"] == due
+    assert "a" in poller.attributes
+    assert "b" not in poller.due
+    assert poller.cursors["c"] == 100
+    assert poller.next_due()[0] == "c"
+
+
+def test_next_due_without_devices() -> None:
+    """A poller without devices waits for an interval."""
+    poller = Poller(_client(), {}, 60)
+
+    device_uuid, due = poller.next_due()
+
+    assert device_uuid is None
+    assert due > time.time() + 59
+
+
+async def test_exited_worker_restarts_with_backoff(hass: HomeAssistant) -> None:
+    """Restarts wait longer after every crash, until a worker ran long enough."""
+    supervisor = BlueairWorker(hass, "user", "password", MagicMock(), [])
+    starts = []
+
+    async def async_start() -> None:
+        starts.append(supervisor._restart_delay)
+        supervisor._started = time.monotonic()
+
+    supervisor.async_start = async_start
+    read_fd, write_fd = os.pipe()
+    supervisor._process = SimpleNamespace(sentinel=read_fd, exitcode=1)
+    supervisor._started = time.monotonic()
+
+    supervisor._async_exited()
+    assert supervisor.restarts == 1
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=1))
+    await hass.async_block_till_done()
+    assert starts == []
+
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + timedelta(seconds=RESTART_DELAY + 1)
+    )
+    await hass.async_block_till_done()
+    assert starts == [2 * RESTART_DELAY]
+
+    for _ in range(10):
+        supervisor._async_exited()
+        supervisor._cancel_restart()
+    assert supervisor._restart_delay == MAX_RESTART_DELAY
+
+    supervisor._started = time.monotonic() - STABLE_SECONDS
+    supervisor._async_exited()
+    assert supervisor._restart_delay == 2 * RESTART_DELAY
+
+    supervisor._cancel_restart()
+    os.close(read_fd)
+    os.close(write_fd)